@@ -1,154 +1,149 @@
 import streamlit as st
-from utils.youtube_utils import get_transcript_or_generate
-from utils.text_processing import chunk_text
-from utils.embedding_utils import store_embeddings, load_vectorstore
-from utils.qa_chain import ask_question
-from utils.cleanup_utils import cleanup_old_files
-from utils.pdf_utils import generate_pdf
+from utils.pipeline import cleanup_if_due, parse_questions
+from utils.qa_chain import format_sources
+from utils.pdf_utils import export_pdf
+from utils.export_utils import export_answers, FORMATS
+from utils import jobs
+from utils.job_queue import get_job
+from utils.metrics import start_http_server
+from config import JOB_POLL_SECONDS, METRICS_HOST, METRICS_PORT, TEMP_AUDIO_DIR
+from utils.logging_utils import configure_logging, set_log_context
 import os
+import time
+import uuid
 import hashlib
 import logging
 from dotenv import load_dotenv
 
-load_dotenv()
+EXPORT_FORMATS = {"PDF": "pdf", "JSONL": "jsonl", "CSV": "csv", "Markdown": "md"}
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
-)
+load_dotenv()
+# Installs the handlers on the first run only; reruns of this script reuse them
+configure_logging()
 
 st.title("YouTube Video Q&A App")
 
-video_url = st.text_area("Enter one or more YouTube Video URLs (one per line)")
-question = st.text_input("Ask a question about the videos or audio")
+video_url = st.text_area("Enter one or more YouTube video, playlist or channel URLs (one per line)")
+mode = st.radio("Mode", ["Single question", "Batch questions (CSV)"], horizontal=True)
+if mode == "Single question":
+    question = st.text_input("Ask a question about the videos or audio")
+    questions_file = None
+else:
+    question = None
+    questions_file = st.file_uploader("Upload a CSV of questions (a 'question' column, or one question per row)", type=["csv"])
 audio_file = st.file_uploader("Or upload a custom audio file", type=["mp3", "mp4", "wav", "m4a"])
 
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
-
-# Cleanup old cache and temp audio files daily
-cleanup_old_files()
-
-# Helper to get audio duration (in seconds)
-def get_audio_duration(audio_path):
-    try:
-        import wave
-        import contextlib
-        if audio_path.endswith('.mp3') or audio_path.endswith('.m4a'):
-            import mutagen
-            from mutagen.mp3 import MP3
-            from mutagen.mp4 import MP4
-            if audio_path.endswith('.mp3'):
-                return MP3(audio_path).info.length
-            elif audio_path.endswith('.m4a'):
-                return MP4(audio_path).info.length
-        elif audio_path.endswith('.wav'):
-            with contextlib.closing(wave.open(audio_path,'r')) as f:
-                frames = f.getnframes()
-                rate = f.getframerate()
-                return frames / float(rate)
-    except Exception:
-        return None
-
-if st.button("Submit") and question:
-    all_chunks = []
-    try:
-        with st.spinner("Processing input..."):
-            cache_dir = "cache"
-            os.makedirs(cache_dir, exist_ok=True)
-            processed_any = False
-
-            # Process audio file if provided
-            if audio_file:
-                audio_path = os.path.join("temp_audio", audio_file.name)
-                os.makedirs("temp_audio", exist_ok=True)
-                with open(audio_path, "wb") as f:
-                    f.write(audio_file.read())
-                hash_id = hashlib.md5(audio_path.encode()).hexdigest()
-                cache_file = os.path.join(cache_dir, f"{hash_id}.txt")
-
-                if os.path.exists(cache_file):
-                    with open(cache_file, "r") as f:
-                        transcript = f.read()
-                else:
-                    st.info("Transcribing uploaded audio with Whisper...")
-                    try:
-                        duration = get_audio_duration(audio_path)
-                        if duration and duration > 600:
-                            st.warning(f"Uploaded audio is long ({int(duration//60)} min). Transcription may take a while.")
-                        transcript = get_transcript_or_generate(None, audio_path)
-                        with open(cache_file, "w") as f:
-                            f.write(transcript)
-                    except RuntimeError as e:
-                        st.warning(f"Audio file: {e}")
-                        transcript = None
-                if transcript:
-                    chunks = chunk_text(transcript)
-                    all_chunks.extend(chunks)
-                    processed_any = True
-
-            # Process YouTube URLs if provided
-            if video_url:
-                urls = video_url.strip().splitlines()
-                for url in urls:
-                    if not url.strip():
-                        continue
-                    video_id = url.split("v=")[-1].split("&")[0]
-                    cache_file = os.path.join(cache_dir, f"{video_id}.txt")
-                    if os.path.exists(cache_file):
-                        with open(cache_file, "r") as f:
-                            transcript = f.read()
-                    else:
-                        st.info(f"Processing {url}...")
-                        try:
-                            transcript = get_transcript_or_generate(url)
-                            # Handle Whisper/YouTube transcript errors
-                            if transcript and transcript.strip().startswith('[ERROR]'):
-                                st.warning(f"{url}: {transcript}")
-                                transcript = None
-                            else:
-                                with open(cache_file, "w") as f:
-                                    f.write(transcript)
-                        except RuntimeError as e:
-                            st.warning(f"{url}: {e}")
-                            transcript = None
-                    if transcript:
-                        # Try to warn if video is long (if audio file exists)
-                        audio_path = os.path.join("temp_audio", f"{video_id}.mp3")
-                        duration = get_audio_duration(audio_path) if os.path.exists(audio_path) else None
-                        if duration and duration > 900:
-                            st.warning(f"Video {url} is long ({int(duration//60)} min). Transcription may take a while.")
-                        chunks = chunk_text(transcript)
-                        all_chunks.extend(chunks)
-                        logging.info(f"Processed {url}")
-                if urls:
-                    processed_any = True
-
-            if not processed_any or not all_chunks:
-                st.warning("No valid transcripts found. Please provide a valid YouTube link or upload an audio file.")
-                st.stop()
-
-            st.info("Generating embeddings and answering your question...")
-            store_embeddings(all_chunks)
-            answer = ask_question(question)
-
-        st.session_state.chat_history.append((question, answer))
+    # The full answers (sources, scores, latencies) behind chat_history, for the data exports
+    st.session_state.answers = []
+    # Export format -> number of turns its file was last prepared with
+    st.session_state.exported = {}
+if 'batch_results_path' not in st.session_state:
+    st.session_state.batch_results_path = None
+if 'job_id' not in st.session_state:
+    # The job id is also kept in the URL, so reloading the page reattaches to a running job
+    st.session_state.job_id = st.query_params.get("job")
+if 'shown_jobs' not in st.session_state:
+    st.session_state.shown_jobs = set()
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:16]
+# Logs written during this run, and by the jobs it submits, carry the browser session's id
+set_log_context(session_id=st.session_state.session_id)
+
+# Cleanup old cache and temp audio files (at most hourly per server process)
+cleanup_if_due()
+# Ingestion and answering run in background workers, so widget interactions do not cancel them
+jobs.start()
+# Prometheus-style metrics for scraping, served once per app process
+start_http_server(METRICS_PORT, METRICS_HOST)
+
+def save_upload(audio_file):
+    """
+    Saves an uploaded audio file under a name derived from its contents and returns the path.
+    """
+    data = audio_file.getvalue()
+    os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
+    name = hashlib.md5(data).hexdigest() + os.path.splitext(audio_file.name)[1]
+    audio_path = os.path.join(TEMP_AUDIO_DIR, name)
+    if not os.path.exists(audio_path):
+        with open(audio_path, "wb") as f:
+            f.write(data)
+    return audio_path
+
+if st.button("Submit") and (question or questions_file):
+    sources = video_url.strip().splitlines() if video_url else []
+    audio_path = save_upload(audio_file) if audio_file else None
+    if question:
+        questions = [question]
+    else:
+        questions = parse_questions(questions_file.getvalue().decode("utf-8-sig"))
+    if not questions:
+        st.warning("No questions found in the uploaded CSV.")
+    elif not sources and not audio_path:
+        st.warning("No valid transcripts found. Please provide a valid YouTube link or upload an audio file.")
+    else:
+        st.session_state.job_id = jobs.submit_qa(sources, questions, audio_path, single=bool(question))
+        st.query_params["job"] = st.session_state.job_id
+
+def show_job(job_id):
+    """
+    Shows the status of a Q&A job, or its answers once it has finished. Returns True while it is still pending.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return False
+    if job["status"] in ("queued", "running"):
+        st.info(job["progress"] or ("Waiting for a worker..." if job["status"] == "queued" else "Processing input..."))
+        return True
+    if job["status"] == "failed":
+        logging.error("Error: %s", job['error'])
+        st.error(job["error"] or "An error occurred while processing. Please check logs.")
+        return False
+    answers = job["result"]["answers"]
+    if job_id not in st.session_state.shown_jobs:
+        st.session_state.shown_jobs.add(job_id)
+        st.session_state.chat_history.extend((a["question"], a["answer"]) for a in answers)
+        st.session_state.answers.extend(answers)
+        st.session_state.batch_results_path = job["result"]["results_path"]
+    if job["payload"]["single"]:
         st.success("Answer")
-        st.write(answer)
+        st.write(answers[0]["answer"])
+        if format_sources(answers[0]["sources"]):
+            st.markdown("**Sources:**\n" + format_sources(answers[0]["sources"]))
+    else:
+        st.success(f"Answered {len(answers)} questions.")
+    return False
+
+job_pending = bool(st.session_state.job_id) and show_job(st.session_state.job_id)
 
-    except Exception as e:
-        logging.error(f"Error: {e}")
-        st.error("An error occurred while processing. Please check logs.")
+if st.session_state.batch_results_path and os.path.exists(st.session_state.batch_results_path):
+    with open(st.session_state.batch_results_path, "rb") as f:
+        st.download_button("Download batch answers as CSV", data=f, file_name="youtube_qa_answers.csv", mime="text/csv")
 
 if st.session_state.chat_history:
     with st.expander("Chat History"):
         for q, a in st.session_state.chat_history:
             st.markdown(f"**Q:** {q}")
             st.markdown(f"**A:** {a}")
-    # Show a single download button outside the expander
-    pdf_bytes = generate_pdf(st.session_state.chat_history)
-    st.download_button("Download Q&A as PDF", data=pdf_bytes, file_name="youtube_qa_chat.pdf", mime="application/pdf")
+    # Exports are only built on request; for the PDF only the turns added since the last export are laid out
+    export_label = st.selectbox("Export format", list(EXPORT_FORMATS))
+    ext = EXPORT_FORMATS[export_label]
+    export_path = os.path.join(TEMP_AUDIO_DIR, f"chat_{st.session_state.session_id}.{ext}")
+    turns = len(st.session_state.chat_history)
+    if st.button("Prepare export"):
+        os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
+        if ext == "pdf":
+            st.session_state.chat_pdf = export_pdf(st.session_state.get("chat_pdf"), st.session_state.chat_history, export_path)
+        else:
+            export_answers(st.session_state.answers, export_path, ext)
+        st.session_state.exported[ext] = turns
+    if st.session_state.exported.get(ext) == turns and os.path.exists(export_path):
+        with open(export_path, "rb") as f:
+            st.download_button(f"Download Q&A as {export_label}", data=f, file_name=f"youtube_qa_chat.{ext}",
+                               mime=FORMATS.get(ext, "application/pdf"))
+
+if job_pending:
+    # Poll the job; rerunning the script only re-renders, the work itself continues in the worker
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,93 @@
+"""
+Benchmarks the BM25 engine (and optionally dense and hybrid retrieval) on a synthetic corpus.
+Each query names a rare "jargon" term planted in exactly one chunk, the case dense retrieval tends to miss.
+
+    python -m benchmarks.bench_bm25 --chunks 12000 --queries 200
+    python -m benchmarks.bench_bm25 --dense      # also needs sentence-transformers and faiss
+"""
+import argparse
+import random
+
+from benchmarks.common import emit, summarize_ms, synthetic_transcript, timed
+from utils.bm25_utils import build_bm25, reciprocal_rank_fusion
+
+SYLLABLES = "ka ri to mu zen vex dor pla qui nash tel obi rau fen gri sol".split()
+
+
+def make_corpus(num_chunks, chunks_per_video, words_per_chunk, num_queries, seed):
+    rng = random.Random(seed)
+    chunks = [synthetic_transcript(words_per_chunk, seed=seed + i) for i in range(num_chunks)]
+    queries = []
+    for target in rng.sample(range(num_chunks), num_queries):
+        term = "".join(rng.choice(SYLLABLES) for _ in range(3)) + str(target)
+        words = chunks[target].split()
+        words.insert(rng.randrange(len(words)), term.capitalize())
+        chunks[target] = " ".join(words)
+        queries.append((f"what did they say about {term.capitalize()} in the video", target))
+    sources = [f"video{i // chunks_per_video}" for i in range(num_chunks)]
+    return chunks, sources, queries
+
+
+def recall_at(rankings, queries, k):
+    hits = sum(1 for ranking, (_, target) in zip(rankings, queries) if target in ranking[:k])
+    return round(hits / len(queries), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=12000)
+    parser.add_argument("--chunks-per-video", type=int, default=120)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dense", action="store_true", help="Also benchmark dense and hybrid retrieval")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    chunks, sources, queries = make_corpus(args.chunks, args.chunks_per_video, args.words, args.queries, args.seed)
+
+    bm25, build_seconds = timed(build_bm25, chunks, sources)
+
+    sparse_rankings, sparse_times = [], []
+    for query, _ in queries:
+        hits, elapsed = timed(bm25.search, query, args.top_k)
+        sparse_rankings.append([doc_id for doc_id, _ in hits])
+        sparse_times.append(elapsed)
+
+    postings_bytes = sum(ids.nbytes + tfs.nbytes for ids, tfs in bm25.postings.values())
+    results = {
+        "chunks": len(chunks),
+        "terms": len(bm25.postings),
+        "postings_mb": round(postings_bytes / 2**20, 3),
+        "build_seconds": round(build_seconds, 3),
+        "bm25": {"search": summarize_ms(sparse_times), f"recall@{args.top_k}": recall_at(sparse_rankings, queries, args.top_k)},
+    }
+
+    if args.dense:
+        import faiss
+        import numpy as np
+        from utils.embedding_utils import get_embedding_model
+        embedding_model = get_embedding_model()
+        embeddings, encode_seconds = timed(embedding_model.encode, chunks, batch_size=64)
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        index.add(np.asarray(embeddings, dtype=np.float32))
+        dense_rankings, dense_times, hybrid_rankings, hybrid_times = [], [], [], []
+        for (query, _), sparse in zip(queries, sparse_rankings):
+            q_emb = embedding_model.encode([query])
+            (D, I), elapsed = timed(index.search, np.asarray(q_emb, dtype=np.float32), args.top_k)
+            dense = [int(i) for i in I[0] if i != -1]
+            dense_rankings.append(dense)
+            dense_times.append(elapsed)
+            fused, fuse_seconds = timed(reciprocal_rank_fusion, [dense, sparse], limit=args.top_k)
+            hybrid_rankings.append(fused)
+            hybrid_times.append(elapsed + fuse_seconds)
+        results["encode_seconds"] = round(encode_seconds, 3)
+        results["dense"] = {"search": summarize_ms(dense_times), f"recall@{args.top_k}": recall_at(dense_rankings, queries, args.top_k)}
+        results["hybrid"] = {"search": summarize_ms(hybrid_times), f"recall@{args.top_k}": recall_at(hybrid_rankings, queries, args.top_k)}
+
+    emit("bm25", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmarks chunking throughput on multi-hour transcripts: the word-based chunk_text against the
+token-aware chunk_text_tokens and chunk_segments. Also reports how much of each word-based chunk lies
+beyond the embedding model's input window and is therefore never embedded.
+
+    python -m benchmarks.bench_chunking --hours 1 3 6
+    python -m benchmarks.bench_chunking --tokenizer sentence-transformers/all-mpnet-base-v2 --max-tokens 382
+"""
+import argparse
+
+from benchmarks.common import WORDS_PER_MINUTE, emit, make_segments, synthetic_transcript, timed
+from utils.text_processing import chunk_text, chunk_text_tokens, chunk_segments
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--tokenizer", default="sentence-transformers/all-mpnet-base-v2")
+    parser.add_argument("--max-tokens", type=int, default=382, help="Token budget per chunk (model window minus special tokens)")
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+
+    results = []
+    for hours in args.hours:
+        num_words = int(hours * 60 * WORDS_PER_MINUTE)
+        text = synthetic_transcript(num_words, seed=int(hours * 10))
+        segments = make_segments(text)
+
+        word_chunks, word_seconds = timed(chunk_text, text)
+        token_chunks, token_seconds = timed(chunk_text_tokens, text, args.max_tokens, args.overlap, tokenizer)
+        segment_chunks, segment_seconds = timed(chunk_segments, segments, args.max_tokens, args.overlap, tokenizer)
+
+        word_chunk_tokens = [len(ids) for ids in tokenizer(word_chunks, add_special_tokens=False, verbose=False)["input_ids"]]
+        total_tokens = sum(word_chunk_tokens)
+        dropped = sum(max(0, n - args.max_tokens) for n in word_chunk_tokens)
+        results.append({
+            "hours": hours,
+            "words": num_words,
+            "tokens": total_tokens,
+            "chunk_text": {
+                "seconds": round(word_seconds, 4),
+                "words_per_sec": round(num_words / word_seconds),
+                "chunks": len(word_chunks),
+                "pct_tokens_beyond_window": round(100 * dropped / total_tokens, 2) if total_tokens else 0.0,
+            },
+            "chunk_text_tokens": {
+                "seconds": round(token_seconds, 4),
+                "words_per_sec": round(num_words / token_seconds),
+                "chunks": len(token_chunks),
+            },
+            "chunk_segments": {
+                "seconds": round(segment_seconds, 4),
+                "words_per_sec": round(num_words / segment_seconds),
+                "chunks": len(segment_chunks),
+            },
+        })
+
+    emit("chunking", {"max_tokens": args.max_tokens, "overlap": args.overlap, "runs": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
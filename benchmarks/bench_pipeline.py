@@ -0,0 +1,286 @@
+"""
+Benchmarks the ingest-and-answer pipeline offline, stage by stage and end to end: chunk_text,
+store_embeddings, load_vectorstore, retrieval and answering in ask_question/ask_questions,
+Whisper's generate_transcript, and ingest -> build_index -> ask_question.
+
+Nothing touches the network or the working directory's cache: fixture transcripts of the requested
+lengths are written as cached transcripts of fake video ids in a scratch directory, audio clips are
+synthesized, and the LLM is a local stub server (HF_API_URL) that answers after --llm-latency-ms.
+The embedding, cross-encoder and Whisper models must be installed (and downloaded) as for the app.
+
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --minutes 5 30 120 --audio-seconds 10 60 --output before.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Only stdlib and benchmarks.common at import time: the pipeline modules are imported after main()
+# has pointed the configuration at the scratch directory and the stub LLM
+from benchmarks.common import WORDS_PER_MINUTE, emit, make_segments, summarize_ms, synthetic_transcript, timed
+
+SAMPLE_RATE = 16000
+
+
+class _StubLLM(BaseHTTPRequestHandler):
+    """
+    Answers Inference API requests with a fixed-size answer after the server's latency.
+    """
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.server.latency)
+        words = payload.get("inputs", "").split()
+        body = json.dumps([{"generated_text": "Stub answer: " + " ".join(words[-40:])}]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_llm(latency_ms):
+    """
+    Starts the stub LLM on a free local port and returns the server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubLLM)
+    server.latency = latency_ms / 1000
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server
+
+
+def fixture_id(i, minutes):
+    # Fixtures pose as YouTube videos, so their ids must be 11 characters
+    return f"fx{i:03d}m{int(minutes):05d}"
+
+
+def write_fixtures(cache_dir, minutes_list, seed):
+    """
+    Writes a cached transcript (text and timed segments) per length and returns the fixtures.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fixtures = []
+    for i, minutes in enumerate(minutes_list):
+        text = synthetic_transcript(int(minutes * WORDS_PER_MINUTE), seed=seed + i)
+        video = fixture_id(i, minutes)
+        with open(os.path.join(cache_dir, f"{video}.txt"), "w") as f:
+            f.write(text)
+        with open(os.path.join(cache_dir, f"{video}.segments.json"), "w") as f:
+            json.dump(make_segments(text), f)
+        fixtures.append({"id": video, "minutes": minutes, "words": len(text.split()), "text": text})
+    return fixtures
+
+
+def write_audio(path, seconds, seed):
+    """
+    Writes a mono 16 kHz WAV of syllable-like tone bursts over noise, so Whisper has to decode every frame.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 80 * np.sin(2 * np.pi * 0.3 * t)
+    envelope = (np.sin(2 * np.pi * 4 * t) > 0).astype(np.float32)
+    signal = 0.4 * np.sin(2 * np.pi * pitch * t) * envelope + 0.05 * rng.standard_normal(t.size)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes())
+    return path
+
+
+def make_questions(fixtures, count, seed):
+    """
+    Builds questions from short word spans of the fixtures, so each has an answer somewhere in the index.
+    """
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        words = fixtures[i % len(fixtures)]["text"].split()
+        start = rng.randrange(max(1, len(words) - 8))
+        questions.append("What do they say about " + " ".join(words[start:start + 6]).strip(".?!") + "?")
+    return questions
+
+
+def stage_summary(stages):
+    from utils.tracing import summary, reset
+    spans = summary()
+    reset()
+    return {stage: spans[stage] for stage in stages if stage in spans}
+
+
+def bench_chunking(fixtures, repeats):
+    from utils.text_processing import chunk_text
+    from utils.pipeline import chunk_result
+    results = []
+    # The configured chunker loads the tokenizer (or embedding model) on first use
+    list(chunk_result({"source_id": None, "transcript": fixtures[0]["text"], "segments": None}))
+    for fixture in fixtures:
+        samples, configured_samples = [], []
+        result = {"source_id": fixture["id"], "transcript": fixture["text"],
+                  "segments": make_segments(fixture["text"])}
+        for _ in range(repeats):
+            chunks, seconds = timed(chunk_text, fixture["text"])
+            samples.append(seconds)
+            configured, seconds = timed(lambda: list(chunk_result(result)))
+            configured_samples.append(seconds)
+        results.append({
+            "id": fixture["id"],
+            "minutes": fixture["minutes"],
+            "words": fixture["words"],
+            "chunk_text": summarize_ms(samples),
+            "chunk_text_chunks": len(chunks),
+            "words_per_second": round(fixture["words"] / (sum(samples) / len(samples)), 1),
+            "configured_chunker": {"chunks": len(configured), **summarize_ms(configured_samples)},
+        })
+    return results
+
+
+def bench_store(results):
+    from utils import embedding_utils
+    from utils.pipeline import iter_chunk_records
+    records = list(iter_chunk_records(results))
+    if os.path.exists(embedding_utils.MANIFEST_PATH):
+        os.remove(embedding_utils.MANIFEST_PATH)
+    stored, cold = timed(embedding_utils.store_embeddings, records)
+    _, unchanged = timed(embedding_utils.store_embeddings, records)
+    return {
+        "chunks": stored,
+        "seconds": round(cold, 3),
+        "chunks_per_second": round((stored or 0) / cold, 1) if cold else None,
+        "unchanged_rerun_ms": round(unchanged * 1000, 3),
+        "stages": stage_summary(["encode", "write_index"]),
+    }
+
+
+def bench_load(repeats):
+    from utils import embedding_utils
+    cold = []
+    for _ in range(repeats):
+        embedding_utils._registry.clear()
+        cold.append(timed(embedding_utils.load_vectorstore)[1])
+    warm = [timed(embedding_utils.load_vectorstore)[1] for _ in range(repeats)]
+    return {"cold": summarize_ms(cold), "warm": summarize_ms(warm),
+            "index_bytes": os.path.getsize(embedding_utils.VECTORSTORE_PATH)}
+
+
+def bench_answering(questions):
+    from utils.qa_chain import ask_question, ask_questions
+    ask_question(questions[0])  # loads the reranker and the index outside the measurement
+    stage_summary([])
+    samples = [timed(ask_question, question)[1] for question in questions]
+    single = {"latency": summarize_ms(samples),
+              "stages": stage_summary(["embed_query", "bm25_search", "faiss_search", "rerank", "llm_call"])}
+    answers, seconds = timed(lambda: list(ask_questions(questions)))
+    batch = {"questions": len(answers), "seconds": round(seconds, 3),
+             "questions_per_second": round(len(answers) / seconds, 2) if seconds else None,
+             "stages": stage_summary(["embed_query", "faiss_search", "rerank", "llm_call"])}
+    return {"ask_question": single, "ask_questions": batch}
+
+
+def bench_transcription(audio_dir, seconds_list, seed):
+    from utils.whisper_utils import generate_transcript, get_whisper_model
+    if get_whisper_model() is None:
+        return {"error": "Whisper model not available"}
+    clips = []
+    for i, seconds in enumerate(seconds_list):
+        path = write_audio(os.path.join(audio_dir, f"clip_{int(seconds)}s.wav"), seconds, seed + i)
+        text, elapsed = timed(generate_transcript, path)
+        clips.append({"audio_seconds": seconds, "seconds": round(elapsed, 3),
+                      "real_time_factor": round(elapsed / seconds, 4),
+                      "error": text if text.startswith("[ERROR]") else None})
+    return {"clips": clips}
+
+
+def bench_end_to_end(fixtures, audio_path, question):
+    """
+    Times ingest -> build_index -> ask_question from a cold index (transcripts come from the fixture cache,
+    the audio clip, if any, is transcribed again).
+    """
+    from config import CACHE_DIR
+    from utils import embedding_utils
+    from utils.pipeline import ingest_sources, ingest_audio, build_index
+    from utils.qa_chain import ask_question
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith(("vectorstore", "embeddings", "bm25", "chunk_meta")) or name.endswith(".minhash.npz"):
+            os.remove(os.path.join(CACHE_DIR, name))
+    embedding_utils._registry.clear()
+    timings = {}
+    start = time.perf_counter()
+    results, timings["ingest"] = timed(ingest_sources, [f["id"] for f in fixtures])
+    if audio_path:
+        from utils.source_keys import audio_key
+        cached = os.path.join(CACHE_DIR, f"{audio_key(audio_path)}.txt")
+        if os.path.exists(cached):
+            os.remove(cached)
+        result, timings["transcribe"] = timed(ingest_audio, audio_path)
+        results.append(result)
+    indexed, timings["build_index"] = timed(build_index, results)
+    _, timings["ask_question"] = timed(ask_question, question)
+    timings["total"] = time.perf_counter() - start
+    return {"chunks": indexed["chunks"], **{f"{k}_seconds": round(v, 3) for k, v in timings.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[5, 30, 120], help="Fixture transcript lengths")
+    parser.add_argument("--audio-seconds", type=float, nargs="+", default=[10, 30], help="Synthetic clip lengths")
+    parser.add_argument("--no-audio", action="store_true", help="Skip Whisper transcription")
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="Stub LLM response delay")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    server = start_stub_llm(args.llm_latency_ms)
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    cwd = os.getcwd()
+    # Set before the pipeline modules read their configuration
+    os.environ.update(HF_API_URL=f"http://127.0.0.1:{server.server_address[1]}/models/{{model}}",
+                      HF_TOKEN=os.environ.get("HF_TOKEN") or "offline-benchmark",
+                      CACHE_DIR="cache", TEMP_AUDIO_DIR="temp_audio", METRICS_PORT="0", TRACING_ENABLED="1")
+    os.chdir(workdir)
+    try:
+        fixtures = write_fixtures("cache", args.minutes, args.seed)
+        questions = make_questions(fixtures, args.questions, args.seed)
+        results = {"config": {k: v for k, v in vars(args).items() if k not in ("output", "keep")}}
+        results["chunk_text"] = bench_chunking(fixtures, args.repeats)
+
+        from utils.pipeline import ingest_sources
+        ingested = ingest_sources([f["id"] for f in fixtures])
+        results["store_embeddings"] = bench_store(ingested)
+        results["load_vectorstore"] = bench_load(args.repeats)
+        results["answering"] = bench_answering(questions)
+
+        audio_path = None
+        if not args.no_audio:
+            os.makedirs("temp_audio", exist_ok=True)
+            results["generate_transcript"] = bench_transcription("temp_audio", args.audio_seconds, args.seed)
+            if "clips" in results["generate_transcript"]:
+                audio_path = os.path.join("temp_audio", f"clip_{int(args.audio_seconds[0])}s.wav")
+        results["end_to_end"] = bench_end_to_end(fixtures, audio_path, questions[0])
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    emit("pipeline", results, output)
+
+
+if __name__ == "__main__":
+    main()
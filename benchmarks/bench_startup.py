@@ -0,0 +1,87 @@
+"""
+Measures cold-start cost: wall time to import the app's modules in a fresh interpreter, the slowest
+imports from `python -X importtime`, and optionally the time to load each model on first use.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --modules utils.qa_chain server --top 15 --models
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import emit, summarize_ms
+
+# What app.py imports before its first widget renders
+DEFAULT_MODULES = ["utils.pipeline", "utils.qa_chain", "utils.pdf_utils"]
+
+MODEL_LOADERS = {
+    "embedding": "from utils.embedding_utils import get_embedding_model as load",
+    "reranker": "from utils.rerank_utils import get_reranker as load",
+    "whisper": "from utils.whisper_utils import get_whisper_model as load",
+}
+
+
+def _run(code, *flags):
+    start = time.perf_counter()
+    path = os.pathsep.join(p for p in (os.getcwd(), os.environ.get("PYTHONPATH")) if p)
+    result = subprocess.run([sys.executable, *flags, "-c", code], capture_output=True, text=True,
+                            cwd=os.getcwd(), env=dict(os.environ, PYTHONPATH=path))
+    return result, time.perf_counter() - start
+
+
+def import_profile(modules, top):
+    """
+    Runs the imports under -X importtime and returns the top slowest packages by cumulative time
+    (top-level entries only, so nested imports are not counted twice), and which heavy ML packages got imported.
+    """
+    result, _ = _run("; ".join(f"import {m}" for m in modules), "-X", "importtime")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        name = name[1:]  # one separator space; the rest is two spaces per nesting level
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append({"module": name.strip(), "depth": depth, "self_ms": int(self_us) / 1000,
+                        "cumulative_ms": int(cumulative_us) / 1000})
+    roots = [e for e in entries if e["depth"] == 0]
+    roots.sort(key=lambda e: e["cumulative_ms"], reverse=True)
+    heavy = [name for name in ("torch", "faiss", "transformers", "sentence_transformers", "whisper")
+             if any(e["module"] == name for e in entries)]
+    return {"top": roots[:top], "heavy_modules_imported": heavy, "error": result.stderr[-500:] if result.returncode else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to report")
+    parser.add_argument("--models", action="store_true", help="Also time each model's first load")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    code = "; ".join(f"import {m}" for m in args.modules)
+    baseline = [_run("pass")[1] for _ in range(args.repeats)]
+    imports = [_run(code)[1] for _ in range(args.repeats)]
+    results = {
+        "modules": args.modules,
+        "interpreter": summarize_ms(baseline),
+        "import": summarize_ms(imports),
+        "profile": import_profile(args.modules, args.top),
+    }
+    if args.models:
+        results["first_load"] = {}
+        for name, loader in MODEL_LOADERS.items():
+            timing = "import time; {0}; s = time.perf_counter(); ok = load() is not None; " \
+                     "print(ok, time.perf_counter() - s)".format(loader)
+            result, _ = _run(timing)
+            ok, seconds = (result.stdout.split() + ["False", "nan"])[:2]
+            results["first_load"][name] = {"loaded": ok == "True", "seconds": round(float(seconds), 3)}
+
+    emit("startup", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
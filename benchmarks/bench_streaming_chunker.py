@@ -0,0 +1,103 @@
+"""
+Compares the streaming word chunker (iter_chunks / chunk_text) against the previous list-based
+implementation on long transcripts: total time, time to the first chunk and peak traced memory.
+
+    python -m benchmarks.bench_streaming_chunker --hours 3 10
+"""
+import argparse
+import re
+import time
+import tracemalloc
+
+from benchmarks.common import emit, synthetic_transcript
+from utils.text_processing import iter_chunks
+
+WORDS_PER_MINUTE = 150
+
+
+def legacy_chunk_text(text, max_length=2000):
+    """
+    The list-based chunker this benchmark compares against: splits every sentence, then every
+    sentence into words, and re-joins the word lists.
+    """
+    sentences = re.split(r'(?<=[.!?]) +', text)
+    chunks = []
+    current_chunk = []
+    current_len = 0
+    for sentence in sentences:
+        words = sentence.split()
+        if not words:
+            continue
+        if current_len + len(words) <= max_length:
+            current_chunk.extend(words)
+            current_len += len(words)
+        else:
+            if current_chunk:
+                chunks.append(' '.join(current_chunk).strip())
+            while len(words) > max_length:
+                chunks.append(' '.join(words[:max_length]).strip())
+                words = words[max_length:]
+            current_chunk = words
+            current_len = len(words)
+    if current_chunk:
+        chunks.append(' '.join(current_chunk).strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def measure(make_iter, repeats=3):
+    """
+    Runs a chunker to completion and returns its best time, time to the first chunk, chunk count,
+    and peak memory from a separate run under tracemalloc (which slows execution down).
+    """
+    best = first = None
+    count = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        first_seen = None
+        count = 0
+        for _ in make_iter():
+            if first_seen is None:
+                first_seen = time.perf_counter() - start
+            count += 1
+        total = time.perf_counter() - start
+        if best is None or total < best:
+            best, first = total, first_seen
+    tracemalloc.start()
+    for _ in make_iter():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": round(best, 4),
+        "first_chunk_ms": round((first or 0.0) * 1000, 3),
+        "chunks": count,
+        "peak_mb": round(peak / 2**20, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[3, 10])
+    parser.add_argument("--max-length", type=int, default=2000, help="Words per chunk")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for hours in args.hours:
+        num_words = int(hours * 60 * WORDS_PER_MINUTE)
+        for punctuate in (True, False):
+            text = synthetic_transcript(num_words, seed=int(hours), punctuate=punctuate)
+            runs.append({
+                "hours": hours,
+                "words": num_words,
+                "text_mb": round(len(text.encode("utf-8")) / 2**20, 3),
+                "punctuated": punctuate,
+                "legacy": measure(lambda: legacy_chunk_text(text, args.max_length)),
+                "streaming": measure(lambda: iter_chunks(text, args.max_length)),
+            })
+
+    emit("streaming_chunker", {"max_length": args.max_length, "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Shared helpers for the benchmark scripts: timing, percentiles, synthetic transcripts and JSON output.
+Run benchmarks from the repo root, e.g. `python -m benchmarks.bench_bm25`.
+"""
+import json
+import random
+import subprocess
+import sys
+import time
+
+FILLER_WORDS = (
+    "the of and to in is that it for was on are as with they be at this have from or one had by "
+    "but not what all were when we there can an your which their said if do will each about how up "
+    "out them then she many some so these would other into has more her two like him see time could "
+    "video people really going know think actually right thing because way just very model data"
+).split()
+
+
+WORDS_PER_MINUTE = 150
+WORDS_PER_SEGMENT = 8
+
+
+def percentile(values, pct):
+    """
+    Returns the pct-th percentile (0-100) of values using linear interpolation.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_ms(samples):
+    """
+    Summarizes a list of durations in seconds as milliseconds (mean, p50, p95, max).
+    """
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """
+    Calls fn and returns (result, elapsed_seconds).
+    """
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def synthetic_transcript(num_words, seed=0, punctuate=True):
+    """
+    Generates a deterministic, transcript-like text of num_words words.
+    With punctuate=False it mimics auto-generated captions, which have no sentence breaks.
+    """
+    rng = random.Random(seed)
+    words = []
+    sentence_length = 0
+    for _ in range(num_words):
+        word = FILLER_WORDS[min(int(rng.paretovariate(1.2)) - 1, len(FILLER_WORDS) - 1)]
+        if rng.random() < 0.3:
+            word = rng.choice(FILLER_WORDS)
+        sentence_length += 1
+        if punctuate and sentence_length > 6 and rng.random() < 0.08:
+            word += rng.choice(".?!")
+            sentence_length = 0
+        words.append(word)
+    return " ".join(words)
+
+
+def make_segments(text):
+    """
+    Splits a synthetic transcript into caption-like timed segments at WORDS_PER_MINUTE.
+    """
+    words = text.split()
+    seconds_per_word = 60.0 / WORDS_PER_MINUTE
+    return [
+        {"text": " ".join(words[i:i + WORDS_PER_SEGMENT]), "start": i * seconds_per_word,
+         "duration": WORDS_PER_SEGMENT * seconds_per_word}
+        for i in range(0, len(words), WORDS_PER_SEGMENT)
+    ]
+
+
+def git_commit():
+    """
+    Returns the current commit hash (with "-dirty" for uncommitted changes), or None outside a git checkout.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def emit(name, results, output=None):
+    """
+    Prints benchmark results as JSON and optionally writes them to output.
+    The commit they were measured on is recorded so runs can be compared (see benchmarks.compare).
+    """
+    payload = {"benchmark": name, "python": sys.version.split()[0], "commit": git_commit(), "results": results}
+    text = json.dumps(payload, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    return payload
@@ -0,0 +1,78 @@
+"""
+Compares two benchmark JSON files (e.g. from two commits) and flags timings that got slower.
+Every numeric leaf whose key names a duration (*_ms, *seconds) is compared; lower is better.
+
+    python -m benchmarks.bench_pipeline --output before.json
+    git checkout my-branch && python -m benchmarks.bench_pipeline --output after.json
+    python -m benchmarks.compare before.json after.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def _is_timing(key):
+    return key.endswith("_ms") or key.endswith("seconds")
+
+
+def flatten(value, prefix=""):
+    """
+    Yields (path, number) for the timing leaves of a nested JSON value. List items are keyed by their
+    "id" or "minutes" field when present, so runs with the same settings line up.
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            path = f"{prefix}.{key}" if prefix else key
+            if isinstance(item, (int, float)) and not isinstance(item, bool):
+                if _is_timing(key):
+                    yield path, float(item)
+            else:
+                yield from flatten(item, path)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = i
+            if isinstance(item, dict):
+                label = item.get("id", item.get("minutes", item.get("audio_seconds", i)))
+            yield from flatten(item, f"{prefix}[{label}]")
+
+
+def compare(before, after, threshold):
+    """
+    Returns rows (path, before, after, relative change, regressed) for timings present in both runs.
+    """
+    old = dict(flatten(before["results"]))
+    rows = []
+    for path, new_value in flatten(after["results"]):
+        # Settings such as the stub LLM's latency are inputs, not measurements
+        if path.startswith("config.") or path not in old:
+            continue
+        base = old[path]
+        change = (new_value - base) / base if base else 0.0
+        rows.append((path, base, new_value, change, change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as a regression")
+    parser.add_argument("--all", action="store_true", help="Print every timing, not only regressions")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    rows = compare(before, after, args.threshold)
+    print(f"{before.get('benchmark')}: {before.get('commit')} -> {after.get('commit')}")
+    regressions = [row for row in rows if row[4]]
+    for path, base, new_value, change, regressed in rows if args.all else regressions:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{path:70s} {base:12.3f} {new_value:12.3f} {change:+8.1%} {flag}")
+    print(f"{len(regressions)} of {len(rows)} timings slower by more than {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
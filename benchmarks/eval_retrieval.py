@@ -0,0 +1,291 @@
+"""
+Evaluates retrieval quality and speed over cached transcripts, sweeping chunker settings, embedding models,
+FAISS index types and top_k, so the fastest configuration that meets a quality bar can be picked.
+Reports recall@k, MRR, p50/p95 search latency, index build time and index memory per configuration.
+
+Labels are JSON lines, one question each, over transcripts already in the cache (CACHE_DIR/<id>.txt):
+
+    {"question": "How is the loss defined?", "source": "https://youtu.be/VIDEO_ID", "start": 312, "end": 340}
+    {"question": "Which optimizer do they use?", "source": "VIDEO_ID", "answer": "we train with AdamW"}
+
+A retrieved chunk counts as relevant if it comes from the labelled source and overlaps [start, end]
+(when both are timed) or contains the answer text; a label with neither accepts any chunk of the source.
+
+Chunkers are given as mode:settings; 0 tokens means the model's input window:
+    tokens:MAX[:OVERLAP]   chunk_segments / chunk_text_tokens (CHUNKING_MODE=tokens)
+    time:WINDOW[:OVERLAP]  chunk_time_windows, in seconds (CHUNKING_MODE=time)
+    semantic:WORDS[:PCT]   chunk_semantic (CHUNKING_MODE=semantic)
+    words:WORDS            chunk_text, the legacy chunker with a budget of WORDS words per chunk
+Index types are faiss.index_factory strings, optionally with search parameters after "@" (FAISS_INDEX and
+FAISS_SEARCH_PARAMS in config.py).
+
+    python -m benchmarks.eval_retrieval --labels labels.jsonl
+    python -m benchmarks.eval_retrieval --labels labels.jsonl --chunkers tokens:0 tokens:128 time:60:10 \\
+        --models all-mpnet-base-v2 all-MiniLM-L6-v2 --indexes Flat HNSW32@efSearch=64 IVF64,Flat@nprobe=8 \\
+        --top-k 1 3 5 10 --hybrid --min-recall 0.8 --at-k 5 --output eval.json
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from benchmarks.common import emit, percentile, timed
+from config import CACHE_DIR, EMBEDDING_MODEL_NAME, CHUNK_OVERLAP_TOKENS
+from utils.source_keys import video_id
+
+NON_WORD = re.compile(r"\W+")
+
+
+def _normalize(text):
+    return NON_WORD.sub(" ", text.lower()).strip()
+
+
+def load_labels(path):
+    """
+    Reads the labelled questions, resolving each source URL to its cache key.
+    """
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            label = json.loads(line)
+            if not label.get("question") or not label.get("source"):
+                raise ValueError(f"{path}:{line_number}: a label needs a question and a source")
+            label["source_id"] = video_id(label["source"]) or label["source"]
+            label["answer"] = _normalize(label["answer"]) if label.get("answer") else None
+            labels.append(label)
+    return labels
+
+
+def load_transcripts(source_ids, cache_dir):
+    """
+    Returns {source_id: (text, segments or None)} from the transcript cache.
+    """
+    transcripts = {}
+    for source_id in source_ids:
+        path = os.path.join(cache_dir, f"{source_id}.txt")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No cached transcript for {source_id}; ingest it first (cli.py ingest)")
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        segments = None
+        segments_path = os.path.join(cache_dir, f"{source_id}.segments.json")
+        if os.path.exists(segments_path):
+            with open(segments_path, encoding="utf-8") as f:
+                segments = json.load(f)
+        transcripts[source_id] = (text, segments)
+    return transcripts
+
+
+def parse_chunker(spec):
+    mode, *values = spec.split(":")
+    numbers = [float(v) for v in values]
+    if mode not in ("tokens", "time", "semantic", "words"):
+        raise ValueError(f"Unknown chunker {spec!r}")
+    return mode, numbers
+
+
+def chunk_all(spec, transcripts, model):
+    """
+    Chunks every transcript with one chunker setting. Returns (texts, sources, starts, ends, embeddings), where
+    embeddings holds the vectors the semantic chunker computes (None for the others).
+    """
+    from utils.text_processing import chunk_text, chunk_text_tokens, chunk_segments, chunk_time_windows, chunk_semantic
+    mode, numbers = parse_chunker(spec)
+    window = model.max_seq_length - 2
+    texts, sources, starts, ends, embeddings = [], [], [], [], []
+    for source_id, (text, segments) in transcripts.items():
+        if mode == "tokens":
+            max_tokens = int(numbers[0]) if numbers and numbers[0] else window
+            overlap = int(numbers[1]) if len(numbers) > 1 else CHUNK_OVERLAP_TOKENS
+            if segments:
+                chunks = chunk_segments(segments, max_tokens, overlap, model.tokenizer)
+            else:
+                chunks = [{"text": c, "start": None, "end": None}
+                          for c in chunk_text_tokens(text, max_tokens, overlap, model.tokenizer)]
+        elif mode == "time":
+            if not segments:
+                continue
+            chunks = chunk_time_windows(segments, *numbers[:2], max_tokens=window, tokenizer=model.tokenizer)
+        elif mode == "semantic":
+            settings = dict(zip(("window_words", "break_percentile"), numbers))
+            if "window_words" in settings:
+                settings["window_words"] = int(settings["window_words"])
+            chunks = chunk_semantic(text=None if segments else text, segments=segments, encoder=model, **settings)
+        else:
+            chunks = [{"text": c, "start": None, "end": None}
+                      for c in chunk_text(text, int(numbers[0]) if numbers else 2000)]
+        for chunk in chunks:
+            texts.append(chunk["text"])
+            sources.append(source_id)
+            starts.append(chunk["start"])
+            ends.append(chunk["end"])
+            embeddings.append(chunk.get("embedding"))
+    return texts, sources, starts, ends, embeddings
+
+
+def relevant_ids(label, texts, sources, starts, ends):
+    """
+    Returns the set of chunk ids that answer a label.
+    """
+    start, end = label.get("start"), label.get("end", label.get("start"))
+    relevant = set()
+    for i, source in enumerate(sources):
+        if source != label["source_id"]:
+            continue
+        if label["answer"] is not None:
+            if label["answer"] in _normalize(texts[i]):
+                relevant.add(i)
+        elif start is not None and starts[i] is not None:
+            if starts[i] <= end and ends[i] >= start:
+                relevant.add(i)
+        elif start is None:
+            relevant.add(i)
+    return relevant
+
+
+def score(rankings, relevant_sets, top_ks):
+    """
+    Returns recall@k for each k (the share of questions with a relevant chunk in the top k) and MRR.
+    """
+    first_hits = []
+    for ranking, relevant in zip(rankings, relevant_sets):
+        rank = next((r for r, doc_id in enumerate(ranking, start=1) if doc_id in relevant), None)
+        first_hits.append(rank)
+    metrics = {f"recall@{k}": round(sum(1 for r in first_hits if r is not None and r <= k) / len(first_hits), 4)
+               for k in top_ks}
+    metrics["mrr"] = round(sum(1 / r for r in first_hits if r is not None) / len(first_hits), 4)
+    return metrics
+
+
+def load_model(name):
+    if name == EMBEDDING_MODEL_NAME:
+        from utils.embedding_utils import get_embedding_model
+        return get_embedding_model()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def evaluate_index(spec, vectors, query_vectors, max_k, bm25=None, questions=None):
+    """
+    Builds one index type over the vectors and searches every question on its own, as the app does.
+    Returns (rankings, build seconds, index bytes, per-query search seconds, factory actually used).
+    """
+    import faiss
+    from utils.embedding_utils import make_index, train_index, apply_search_params
+    from utils.bm25_utils import reciprocal_rank_fusion
+    factory, _, params = spec.partition("@")
+    start = time.perf_counter()
+    index = make_index(vectors.shape[1], factory)
+    if index.is_trained:
+        index.add(vectors)
+    else:
+        index = train_index(index, [vectors])
+    build_seconds = time.perf_counter() - start
+    apply_search_params(index, params)
+    index_bytes = int(faiss.serialize_index(index).nbytes)
+    rankings, latencies = [], []
+    for i in range(len(query_vectors)):
+        start = time.perf_counter()
+        _, ids = index.search(query_vectors[i:i + 1], min(max_k, index.ntotal))
+        ranking = [int(doc_id) for doc_id in ids[0] if doc_id != -1]
+        if bm25 is not None:
+            sparse = [doc_id for doc_id, _ in bm25.search(questions[i], max_k)]
+            ranking = reciprocal_rank_fusion([ranking, sparse])[:max_k]
+        latencies.append(time.perf_counter() - start)
+        rankings.append(ranking)
+    return rankings, build_seconds, index_bytes, latencies, type(index).__name__
+
+
+def pick_best(rows, min_recall, at_k):
+    """
+    Returns the configuration with the lowest p95 search latency whose recall@at_k is at least min_recall.
+    """
+    key = f"recall@{at_k}"
+    passing = [row for row in rows if row.get(key, 0) >= min_recall]
+    if not passing:
+        return None
+    return min(passing, key=lambda row: (row["search_p95_ms"], row["build_seconds"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", required=True, help="JSON lines of labelled questions")
+    parser.add_argument("--chunkers", nargs="+", default=["tokens:0"])
+    parser.add_argument("--models", nargs="+", default=[EMBEDDING_MODEL_NAME])
+    parser.add_argument("--indexes", nargs="+", default=["Flat", "HNSW32"])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--hybrid", action="store_true", help="Also evaluate dense + BM25 fusion, as the app retrieves")
+    parser.add_argument("--min-recall", type=float, default=0.8, help="Quality bar for picking the best configuration")
+    parser.add_argument("--at-k", type=int, default=5, help="k of the recall the quality bar applies to")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    transcripts = load_transcripts(dict.fromkeys(label["source_id"] for label in labels), args.cache_dir)
+    questions = [label["question"] for label in labels]
+    top_ks = sorted(set(args.top_k) | {args.at_k})
+    max_k = top_ks[-1]
+
+    rows = []
+    for model_name in args.models:
+        model = load_model(model_name)
+        if model is None:
+            raise RuntimeError(f"Could not load embedding model {model_name}")
+        query_vectors, _ = timed(lambda: np.asarray(model.encode(questions, batch_size=64), dtype=np.float32))
+        query_latencies = [timed(model.encode, [q])[1] for q in questions[:50]]
+        for chunker in args.chunkers:
+            (texts, sources, starts, ends, precomputed), chunk_seconds = timed(chunk_all, chunker, transcripts, model)
+            if not texts:
+                continue
+            missing = [i for i, v in enumerate(precomputed) if v is None]
+            vectors = list(precomputed)
+            encoded, encode_seconds = timed(model.encode, [texts[i] for i in missing], batch_size=64)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+            vectors = np.asarray(np.vstack(vectors), dtype=np.float32)
+            relevant_sets = [relevant_ids(label, texts, sources, starts, ends) for label in labels]
+            bm25 = None
+            if args.hybrid:
+                from utils.bm25_utils import build_bm25
+                bm25 = build_bm25(texts, sources)
+            for index_spec in args.indexes:
+                for retrieval in (("dense", "hybrid") if bm25 is not None else ("dense",)):
+                    rankings, build_seconds, index_bytes, latencies, index_class = evaluate_index(
+                        index_spec, vectors, query_vectors, max_k,
+                        bm25 if retrieval == "hybrid" else None, questions)
+                    rows.append({
+                        "model": model_name,
+                        "chunker": chunker,
+                        "index": index_spec,
+                        "index_class": index_class,
+                        "retrieval": retrieval,
+                        "chunks": len(texts),
+                        "unanswerable_questions": sum(1 for r in relevant_sets if not r),
+                        **score(rankings, relevant_sets, top_ks),
+                        "search_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                        "search_p95_ms": round(percentile(latencies, 95) * 1000, 3),
+                        "query_encode_p95_ms": round(percentile(query_latencies, 95) * 1000, 3),
+                        "chunk_seconds": round(chunk_seconds, 3),
+                        "encode_seconds": round(encode_seconds, 3),
+                        "build_seconds": round(build_seconds, 4),
+                        "index_bytes": index_bytes,
+                    })
+
+    results = {
+        "labels": len(labels),
+        "sources": len(transcripts),
+        "quality_bar": {"min_recall": args.min_recall, "at_k": args.at_k},
+        "best": pick_best(rows, args.min_recall, args.at_k),
+        "configurations": rows,
+    }
+    emit("retrieval_eval", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
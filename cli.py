@@ -0,0 +1,145 @@
+"""
+Headless command-line entry point for ingestion and question answering, without Streamlit.
+
+    python -m cli ingest --file urls.txt --workers 4
+    python -m cli index "https://www.youtube.com/playlist?list=PLAYLIST_ID"
+    python -m cli index https://www.youtube.com/watch?v=VIDEO_ID lecture.mp3
+    python -m cli ask "What is RAFT?" --questions-file questions.csv --output answers.csv
+    python -m cli ask --questions-file questions.txt --format md > answers.md
+    python -m cli warm-cache --file urls.txt
+
+Heavy modules (models, FAISS) are imported inside the subcommands so `--help` stays fast.
+"""
+import argparse
+import json
+import logging
+import sys
+
+from dotenv import load_dotenv
+
+
+def _collect_sources(args):
+    from utils.pipeline import read_sources_file
+    sources = list(args.sources)
+    for path in args.file or []:
+        sources.extend(read_sources_file(path))
+    return sources
+
+
+def _ingest(args):
+    from utils.pipeline import ingest_sources
+    sources = _collect_sources(args)
+    if not sources:
+        logging.error("No URLs or audio files given.")
+        return []
+    results = ingest_sources(sources, max_workers=args.workers, local_files=True)
+    ok = sum(1 for r in results if r["transcript"])
+    cached = sum(1 for r in results if r["cached"])
+    logging.info("Ingested %s/%s sources (%s from cache).", ok, len(results), cached)
+    return results
+
+
+def cmd_ingest(args):
+    results = _ingest(args)
+    for r in results:
+        print(json.dumps({"source": r["source"], "source_id": r["source_id"], "cached": r["cached"], "error": r["error"]}))
+    return 0 if results and all(r["transcript"] for r in results) else 1
+
+
+def cmd_index(args):
+    from utils.pipeline import build_index
+    results = _ingest(args)
+    indexed = build_index(results)
+    if not indexed["chunks"]:
+        logging.error("No valid transcripts found; index not built.")
+        return 1
+    print(json.dumps({"chunks": indexed["chunks"], "sources": len(indexed["sources"])}))
+    return 0
+
+
+def _read_questions(path):
+    from utils.pipeline import parse_questions
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return parse_questions(f.read(), csv_format=path.lower().endswith(".csv"))
+
+
+def cmd_ask(args):
+    from utils.qa_chain import ask_questions
+    from utils.export_utils import export_answers, format_for
+    questions = list(args.questions)
+    if args.questions_file:
+        questions.extend(_read_questions(args.questions_file))
+    if not questions:
+        logging.error("No questions given.")
+        return 1
+    # Without --format, an --output file is CSV unless its extension says otherwise, as before
+    fmt = args.format or format_for(args.output, default="csv" if args.output else "jsonl")
+    answers = ask_questions(questions, sources=args.source or None, top_k=args.top_k)
+    if args.output:
+        count = export_answers(answers, args.output, fmt)
+        logging.info("Wrote %s answers to %s.", count, args.output)
+    else:
+        export_answers(answers, sys.stdout, fmt)
+    return 0
+
+
+def cmd_warm_cache(args):
+    from utils.pipeline import cleanup_if_due, warm_models
+    cleanup_if_due()
+    status = warm_models()
+    print(json.dumps({"models": status}))
+    if args.sources or args.file:
+        results = _ingest(args)
+        return 0 if all(r["transcript"] for r in results) else 1
+    return 0 if all(status.values()) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="YouTube Q&A pipeline without the web UI.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log debug messages")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_source_args(p):
+        p.add_argument("sources", nargs="*", help="YouTube video, playlist or channel URLs, or local audio files")
+        p.add_argument("-f", "--file", action="append", help="Text file with one URL or audio path per line (repeatable)")
+        p.add_argument("-w", "--workers", type=int, help="Sources fetched in parallel (default: INGEST_MAX_WORKERS)")
+
+    p = sub.add_parser("ingest", help="Fetch or generate transcripts into the cache")
+    add_source_args(p)
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("index", help="Ingest sources and build the vector and keyword indexes from them")
+    add_source_args(p)
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser("ask", help="Answer questions against the current index")
+    p.add_argument("questions", nargs="*", help="Questions to answer")
+    p.add_argument("-q", "--questions-file", help="CSV (with a 'question' column or one per row) or text file")
+    p.add_argument("-s", "--source", action="append", help="Restrict retrieval to this source id (repeatable)")
+    p.add_argument("-k", "--top-k", type=int, default=5)
+    p.add_argument("-o", "--output", help="Write answers to this file instead of stdout")
+    p.add_argument("--format", choices=["jsonl", "csv", "md"],
+                   help="Output format (default: from the --output extension, else csv for files and jsonl for stdout): answers with their "
+                        "source chunks, scores, timestamps and per-stage latencies")
+    p.set_defaults(func=cmd_ask)
+
+    p = sub.add_parser("warm-cache", help="Load models and optionally pre-ingest sources")
+    add_source_args(p)
+    p.set_defaults(func=cmd_warm_cache)
+    return parser
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    from utils.logging_utils import configure_logging
+    configure_logging(level=logging.DEBUG if args.verbose else None)
+    status = args.func(args)
+    if args.verbose:
+        from utils.tracing import summary
+        logging.debug("Stage latencies: %s", json.dumps(summary()))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
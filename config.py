@@ -6,11 +6,92 @@ TEMP_AUDIO_DIR = os.environ.get("TEMP_AUDIO_DIR", "temp_audio")  # Directory for
 
 # Expiry
 CACHE_EXPIRY_SECONDS = int(os.environ.get("CACHE_EXPIRY_SECONDS", 24 * 3600))  # Cache expiry in seconds (default: 1 day)
+NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get("NEGATIVE_CACHE_TTL_SECONDS", 600))  # Skip a failed source for this long, doubling per failure
+NEGATIVE_CACHE_MAX_TTL_SECONDS = int(os.environ.get("NEGATIVE_CACHE_MAX_TTL_SECONDS", 6 * 3600))  # Upper bound for the failure backoff
 
 # Model names
 EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-mpnet-base-v2")
 QA_MODEL_NAME = os.environ.get("QA_MODEL_NAME", "deepset/roberta-base-squad2")
 WHISPER_MODEL_NAME = os.environ.get("WHISPER_MODEL_NAME", "small")
+RERANK_MODEL_NAME = os.environ.get("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+HF_API_URL = os.environ.get("HF_API_URL", "https://api-inference.huggingface.co/models/{model}")  # LLM endpoint; {model} is the model name
+
+# Transcripts
+TRANSCRIPT_LANGUAGES = [lang.strip().lower() for lang in os.environ.get("TRANSCRIPT_LANGUAGES", "en,hi").split(",") if lang.strip()]  # Caption languages in priority order
+TRANSCRIPT_PREFER_MANUAL = os.environ.get("TRANSCRIPT_PREFER_MANUAL", "1") != "0"  # Manual captions before auto-generated ones
+TRANSCRIPT_TRANSLATE_TO = os.environ.get("TRANSCRIPT_TRANSLATE_TO", "en")  # Translate other captions to this language ("" = keep original)
+TRANSCRIPT_TIMEOUT_SECONDS = float(os.environ.get("TRANSCRIPT_TIMEOUT_SECONDS", 15))  # Per-request timeout for caption requests
+NORMALIZE_TRANSCRIPTS = os.environ.get("NORMALIZE_TRANSCRIPTS", "1") != "0"  # Dedup rolling captions and drop [Music]-style noise
+
+# Near-duplicate chunk filtering (MinHash/LSH)
+DEDUP_CHUNKS = os.environ.get("DEDUP_CHUNKS", "1") != "0"  # Drop near-duplicate chunks before embedding and from contexts
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.8))  # Estimated Jaccard similarity of word 3-grams
+MINHASH_PERMUTATIONS = int(os.environ.get("MINHASH_PERMUTATIONS", 64))  # Signature length
+MINHASH_BANDS = int(os.environ.get("MINHASH_BANDS", 16))  # LSH bands (must divide MINHASH_PERMUTATIONS)
+
+# Chunking
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 0))  # Tokens per chunk (0 = the embedding model's input window)
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))  # Tokens shared by consecutive chunks
+# "tokens": adaptive windows of whole timed segments up to CHUNK_MAX_TOKENS; "time": fixed time windows;
+# "semantic": boundaries where the topic shifts, for captions without punctuation
+CHUNKING_MODE = os.environ.get("CHUNKING_MODE", "tokens")
+CHUNK_WINDOW_SECONDS = float(os.environ.get("CHUNK_WINDOW_SECONDS", 60))  # Length of a "time" mode window
+CHUNK_WINDOW_OVERLAP_SECONDS = float(os.environ.get("CHUNK_WINDOW_OVERLAP_SECONDS", 10))  # Overlap between time windows
+SEMANTIC_WINDOW_WORDS = int(os.environ.get("SEMANTIC_WINDOW_WORDS", 40))  # Words per window compared in "semantic" mode
+SEMANTIC_BREAK_PERCENTILE = float(os.environ.get("SEMANTIC_BREAK_PERCENTILE", 20))  # Lowest similarities that become boundaries
+
+# Retrieval
+FAISS_INDEX = os.environ.get("FAISS_INDEX", "Flat")  # faiss.index_factory string: "Flat", "HNSW32", "IVF256,Flat", ...
+FAISS_SEARCH_PARAMS = os.environ.get("FAISS_SEARCH_PARAMS", "")  # Search-time parameters, e.g. "nprobe=16" or "efSearch=64"
+RETRIEVAL_FETCH_K = int(os.environ.get("RETRIEVAL_FETCH_K", 30))  # Candidates over-fetched from FAISS before reranking
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", 32))  # (question, chunk) pairs scored per cross-encoder batch
+CONTEXT_MAX_CHARS = int(os.environ.get("CONTEXT_MAX_CHARS", 6000))  # Context budget for the LLM prompt
+
+# Bulk ingestion
+INGEST_MAX_WORKERS = int(os.environ.get("INGEST_MAX_WORKERS", 4))  # Sources fetched/transcribed in parallel per ingest call
+PLAYLIST_MAX_VIDEOS = int(os.environ.get("PLAYLIST_MAX_VIDEOS", 500))  # Videos taken from one playlist or channel
+PLAYLIST_CACHE_SECONDS = int(os.environ.get("PLAYLIST_CACHE_SECONDS", 3600))  # Reuse a playlist's video list for this long
+YTDLP_TIMEOUT_SECONDS = int(os.environ.get("YTDLP_TIMEOUT_SECONDS", 120))  # Timeout for listing a playlist with yt-dlp
+
+# Batch question answering
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))  # Max LLM API calls in flight at once
+
+# Persistent job queue (SQLite) for ingestion and question answering
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", "jobs.sqlite3")  # Job table shared by the app and the API server
+INDEX_LOCK_PATH = os.environ.get("INDEX_LOCK_PATH", "index.lock")  # Lock file for the index; kept out of CACHE_DIR, which cleanup empties
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))  # Worker threads per app process
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 1.0))  # How often idle workers and the UI check for updates
+JOB_REUSE_SECONDS = int(os.environ.get("JOB_REUSE_SECONDS", 24 * 3600))  # Reuse a finished identical Q&A job this long
+
+# Tracing
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "1") != "0"  # Time pipeline stages and log them as JSON spans
+TRACE_WINDOW = int(os.environ.get("TRACE_WINDOW", 1000))  # Recent spans per stage kept for p50/p95 summaries
+
+# Metrics
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")  # Interface the Streamlit app's /metrics endpoint binds to
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9108))  # Port of the Streamlit app's /metrics endpoint (0 disables)
+
+# Logging
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")  # Root log level
+LOG_FILE = os.environ.get("LOG_FILE", "app.log")  # JSON-lines log file ("" = console only)
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))  # Rotate the log file at this size
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))  # Rotated log files to keep
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN", "")  # Rotate by time instead, e.g. "midnight" or "H"
+
+# PDF export
+# TrueType fonts for the chat PDF, comma-separated: the first one found sets the text, the others fill in
+# scripts it lacks (Devanagari, ...). Without any, non-latin-1 characters are replaced.
+PDF_FONT_PATHS = [path.strip() for path in os.environ.get("PDF_FONT_PATHS", ",".join([
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansDevanagari-Regular.ttf",
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+    "C:/Windows/Fonts/Nirmala.ttf",
+])).split(",") if path.strip()]
+
+# API server worker pools
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 2))  # Concurrent ingest jobs (downloads, Whisper, embedding)
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", 8))  # Concurrent /ask requests
 
 """
 Configuration module for the YT_Q&A_APP.
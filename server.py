@@ -0,0 +1,177 @@
+"""
+HTTP/JSON API for the Q&A pipeline, for calling it from other systems without Streamlit.
+
+    uvicorn server:app --host 0.0.0.0 --port 8000
+
+Endpoints:
+    POST /ingest       {"sources": [...], "index": true}        -> 202 {"job_id": ...}
+    POST /ask          {"question": "..."} or {"questions": [...], "sources": [...], "top_k": 5}
+                       (400 if a source id is not in the index)
+    GET  /jobs/{id}    status and result of an ingest job (jobs live in the SQLite job table shared with the app)
+    GET  /stats        per-stage latency percentiles from the tracing spans
+    GET  /metrics      counters, gauges and histograms in the Prometheus text format
+    GET  /health       liveness
+    GET  /ready        200 once the models are loaded and warmed up, 503 before (for load balancer checks)
+
+Models (SentenceTransformer, cross-encoder, Whisper) and the loaded FAISS/BM25 indexes are process-wide
+singletons shared by all requests. Blocking work runs in thread pools so the event loop stays responsive:
+torch, FAISS and the HTTP client release the GIL, and threads share the loaded models where worker
+processes would each need their own copy.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from config import INGEST_WORKERS, QUERY_WORKERS
+
+from utils.logging_utils import configure_logging, log_context
+
+load_dotenv()
+configure_logging()
+
+# Long transcriptions and embedding run as queued jobs on INGEST_WORKERS job workers, queries on their
+# own pool, so ingestion cannot starve /ask
+query_pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+
+# Set by the warm-up thread; traffic should only be routed here once ready is True
+readiness = {"ready": False, "started": None, "finished": None, "models": None}
+
+
+class IngestRequest(BaseModel):
+    sources: List[str]
+    index: bool = True
+
+
+class AskRequest(BaseModel):
+    question: Optional[str] = None
+    questions: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    top_k: int = 5
+
+
+def _warm_up():
+    from utils.pipeline import warm_up
+    readiness["started"] = time.time()
+    status = warm_up()
+    readiness.update(models=status, finished=time.time(),
+                     ready=status["embedding"]["ok"] and status["faiss"]["ok"])
+    if not status["whisper"]["ok"]:
+        logging.warning("Whisper is unavailable; only videos with captions can be ingested.")
+
+
+async def _in_pool(fn, *args):
+    """
+    Runs fn on the query pool in a copy of the caller's context, so its logs keep the request id.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_pool, functools.partial(contextvars.copy_context().run, fn, *args))
+
+
+def _unknown_sources(sources):
+    from utils.qa_chain import unknown_sources
+    return unknown_sources(sources)
+
+
+def _answer(questions, sources, top_k):
+    from utils.qa_chain import ask_questions
+    return list(ask_questions(questions, sources=sources, top_k=top_k))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    from utils.pipeline import cleanup_if_due
+    from utils import jobs, job_queue
+    # Load and warm the shared models in the background; /health answers right away, /ready once they are hot
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    jobs.start(INGEST_WORKERS)
+    await _in_pool(cleanup_if_due)
+    yield
+    job_queue.stop_workers()
+    query_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="YouTube Video Q&A API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def request_id(request: Request, call_next):
+    # Every log record written while handling the request (including in the pools and jobs it starts)
+    # carries this id; callers can pass their own to correlate logs across services
+    rid = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    with log_context(request_id=rid):
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = rid
+    return response
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    status_code = 200 if readiness["ready"] else 503
+    return JSONResponse(status_code=status_code, content=dict(readiness))
+
+
+@app.get("/stats")
+async def stats():
+    from utils.tracing import summary
+    return {"stages": summary()}
+
+
+@app.get("/metrics")
+async def metrics():
+    from utils.metrics import render, CONTENT_TYPE
+    # Directory sizes and queue depth are read at scrape time, off the event loop
+    body = await _in_pool(render)
+    return Response(content=body, media_type=CONTENT_TYPE)
+
+
+@app.post("/ingest", status_code=202)
+async def ingest(request: IngestRequest):
+    sources = [s.strip() for s in request.sources if s.strip()]
+    if not sources:
+        raise HTTPException(status_code=400, detail="No sources given.")
+    from utils.jobs import submit_ingest
+    job_id = await _in_pool(submit_ingest, sources, request.index)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    questions = list(request.questions or [])
+    if request.question:
+        questions.insert(0, request.question)
+    if not questions:
+        raise HTTPException(status_code=400, detail="No question given.")
+    sources = request.sources or None
+    if sources:
+        # Answering without the requested sources' chunks would give ungrounded answers
+        missing = await _in_pool(_unknown_sources, sources)
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Sources not in the index: {', '.join(missing)}")
+    answers = await _in_pool(_answer, questions, sources, request.top_k)
+    return {"answers": answers}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    from utils.job_queue import get_job as load_job
+    job = await _in_pool(load_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job
@@ -0,0 +1,79 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from utils import embedding_utils, qa_chain
+from utils.pipeline import build_index
+
+TRANSCRIPT = ("the speaker explains how the reservoir was built in the valley and why the old dam failed "
+              "after the spring floods then the engineers describe the new spillway the concrete they used "
+              "and how the town now measures the water level every hour during the rainy season")
+
+
+class HashingEncoder:
+    """Bag-of-words vectors, enough for FAISS to return something without loading a model."""
+
+    # No tokenizer: chunking falls back to word counts
+    tokenizer = None
+    max_seq_length = 258
+
+    def encode(self, texts, batch_size=None):
+        vectors = np.zeros((len(texts), 32), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % 32] += 1
+        return vectors
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(embedding_utils, "get_embedding_model", lambda: HashingEncoder())
+    monkeypatch.setattr(qa_chain, "get_embedding_model", lambda: HashingEncoder())
+    monkeypatch.setattr(qa_chain, "call_llm", lambda prompt, hf_model=None: "answer")
+    embedding_utils._registry.clear()
+    yield tmp_path
+    embedding_utils._registry.clear()
+
+
+def test_reupload_deduplicated_away_is_not_reported_as_indexed(store_dir):
+    results = [{"source_id": video, "transcript": TRANSCRIPT, "segments": None} for video in ("orig", "reupload")]
+    indexed = build_index(results)
+    assert indexed["chunks"] > 0
+    assert indexed["sources"] == ["orig"]
+    answers = list(qa_chain.ask_questions(["why did the dam fail?"], sources=indexed["sources"]))
+    assert answers[0]["answer"] == "answer"
+
+
+def test_batch_job_answers_without_holding_the_index_lock(store_dir, monkeypatch):
+    import fcntl
+    from utils import jobs
+    results = [{"source": "orig", "source_id": "orig", "transcript": TRANSCRIPT, "segments": None,
+                "cached": True, "error": None}]
+    monkeypatch.setattr(jobs, "_ingest", lambda sources, audio_path, notify: results)
+    writable = []
+
+    def call_llm(prompt, hf_model=None):
+        # Another process (a separate open file) must be able to take the lock while questions are answered
+        with open(embedding_utils.INDEX_LOCK_PATH, "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(f, fcntl.LOCK_UN)
+                writable.append(True)
+            except BlockingIOError:
+                writable.append(False)
+        return "answer"
+
+    monkeypatch.setattr(qa_chain, "call_llm", call_llm)
+    payload = {"sources": ["orig"], "questions": ["why did the dam fail?", "what was built?"],
+               "single": False, "top_k": 2, "job_key": "test"}
+    done = jobs.run_qa(payload, lambda level, message: None)
+    assert [a["answer"] for a in done["answers"]] == ["answer", "answer"]
+    assert writable == [True, True]
+
+
+def test_empty_source_list_means_no_restriction(store_dir):
+    build_index([{"source_id": "orig", "transcript": TRANSCRIPT, "segments": None}])
+    answers = list(qa_chain.ask_questions(["why did the dam fail?"], sources=[]))
+    assert answers[0]["answer"] == "answer"
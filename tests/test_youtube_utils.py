@@ -0,0 +1,38 @@
+import requests
+from youtube_transcript_api._transcripts import Transcript, _TranslationLanguage
+
+from utils.youtube_utils import pick_transcript, is_permanent_failure
+
+
+def make_transcript(code, generated=False, translation_codes=()):
+    languages = [_TranslationLanguage(language=c, language_code=c) for c in translation_codes]
+    return Transcript(requests.Session(), "vid", "https://www.youtube.com/api/timedtext?v=vid", code, code,
+                      generated, languages)
+
+
+def test_prefers_listed_language_and_manual_captions():
+    manual = make_transcript("en")
+    generated = make_transcript("en", generated=True)
+    assert pick_transcript([generated, manual], languages=["en"]) is manual
+
+
+def test_translates_when_no_preferred_language():
+    picked = pick_transcript([make_transcript("de", translation_codes=["fr", "en"])],
+                             languages=["hi"], translate_to="en")
+    assert picked.language_code == "en"
+    assert "tlang=en" in picked._url
+
+
+def test_falls_back_to_any_transcript():
+    only = make_transcript("de", translation_codes=["fr"])
+    assert pick_transcript([only], languages=["hi"], translate_to="en") is only
+    assert pick_transcript([], languages=["en"]) is None
+
+
+def test_only_refused_downloads_are_permanent_failures():
+    assert is_permanent_failure("[ERROR] yt-dlp failed to download audio: ERROR: [youtube] vid: Video unavailable")
+    assert is_permanent_failure("[ERROR] yt-dlp failed to download audio: ERROR: [youtube] vid: Private video")
+    assert not is_permanent_failure("[ERROR] yt-dlp failed to download audio: ERROR: Unable to download webpage: "
+                                    "<urlopen error [Errno -3] Temporary failure in name resolution>")
+    assert not is_permanent_failure("[ERROR] Whisper model not loaded.")
+    assert not is_permanent_failure("[ERROR] Could not retrieve or generate transcript for this video: timed out")
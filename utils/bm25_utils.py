@@ -0,0 +1,118 @@
+import re
+import math
+from itertools import groupby
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text):
+    """
+    Lowercases text and splits it into word tokens. Keeps digits and non-Latin scripts.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over text chunks.
+    Postings are stored per term as compact numpy arrays (int32 doc ids, uint16 term frequencies).
+    Documents are added per source (video or audio file), and the index is rebuilt whole with the FAISS
+    index it sits next to. Doc ids are assigned in insertion order, matching the row order of the FAISS
+    index built from the same chunks.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.sources = {}
+        self.total_length = 0
+
+    @property
+    def num_docs(self):
+        return len(self.doc_lengths)
+
+    def add_source(self, source_id, chunks):
+        """
+        Appends chunks of one source and returns the list of doc ids assigned to them.
+        Chunks added again for a source already in the index are appended to it.
+        """
+        first = len(self.doc_lengths)
+        doc_ids = list(range(first, first + len(chunks)))
+        lengths = np.zeros(len(chunks), dtype=np.int32)
+        new_postings = {}
+        for offset, chunk in enumerate(chunks):
+            counts = {}
+            for token in tokenize(chunk):
+                counts[token] = counts.get(token, 0) + 1
+            lengths[offset] = sum(counts.values())
+            doc_id = first + offset
+            for token, tf in counts.items():
+                ids, tfs = new_postings.setdefault(token, ([], []))
+                ids.append(doc_id)
+                tfs.append(min(tf, 65535))
+        for token, (ids, tfs) in new_postings.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            tfs = np.asarray(tfs, dtype=np.uint16)
+            if token in self.postings:
+                old_ids, old_tfs = self.postings[token]
+                ids = np.concatenate([old_ids, ids])
+                tfs = np.concatenate([old_tfs, tfs])
+            self.postings[token] = (ids, tfs)
+        self.doc_lengths = np.concatenate([self.doc_lengths, lengths])
+        self.sources.setdefault(source_id, []).extend(doc_ids)
+        self.total_length += int(lengths.sum())
+        return doc_ids
+
+    def search(self, query, top_k=10):
+        """
+        Returns up to top_k (doc_id, score) pairs for the query, best first.
+        """
+        num_docs = self.num_docs
+        if num_docs == 0:
+            return []
+        avg_length = self.total_length / num_docs if self.total_length else 1.0
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        for token in set(tokenize(query)):
+            entry = self.postings.get(token)
+            if entry is None:
+                continue
+            ids, tfs = entry[0], entry[1].astype(np.float32)
+            idf = math.log(1 + (num_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / avg_length)
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in order]
+
+
+def build_bm25(chunks, source_ids=None):
+    """
+    Builds a BM25 index over the chunks, adding each run of chunks from the same source in turn.
+    source_ids is a list parallel to chunks; without it all chunks belong to a single source.
+    """
+    if source_ids is None:
+        source_ids = [None] * len(chunks)
+    bm25 = BM25Index()
+    position = 0
+    for source_id, group in groupby(source_ids):
+        size = len(list(group))
+        bm25.add_source(source_id if source_id is not None else position, chunks[position:position + size])
+        position += size
+    return bm25
+
+
+def reciprocal_rank_fusion(rankings, k=60, limit=None):
+    """
+    Fuses several ranked lists of doc ids with reciprocal-rank fusion (score = sum of 1 / (k + rank)).
+    Returns the fused list of doc ids, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    ordered = sorted(fused, key=fused.get, reverse=True)
+    return ordered[:limit] if limit else ordered
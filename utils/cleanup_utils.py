@@ -22,6 +22,6 @@ def cleanup_old_files():
                 if file_age > CACHE_EXPIRY_SECONDS:
                     try:
                         os.remove(filepath)
-                        logging.info(f"Deleted old file: {filepath}")
+                        logging.info("Deleted old file: %s", filepath)
                     except Exception as e:
-                        logging.warning(f"Failed to delete {filepath}: {e}")
+                        logging.warning("Failed to delete %s: %s", filepath, e)
@@ -0,0 +1,154 @@
+import os
+import logging
+import hashlib
+import zlib
+from itertools import groupby
+
+import numpy as np
+
+from config import CACHE_DIR, DEDUP_THRESHOLD, MINHASH_PERMUTATIONS, MINHASH_BANDS
+
+SHINGLE_WORDS = 3
+# Part of the stored signature keys; bump it when shingles() changes so stored signatures are recomputed
+SIGNATURE_VERSION = 2
+
+_rng = np.random.default_rng(0x5EED)
+# Multiply-shift hash family: (a * h + b) >> 32 with odd 64-bit a, one (a, b) pair per permutation
+_HASH_A = _rng.integers(1, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_EMPTY = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+def shingles(text, size=SHINGLE_WORDS):
+    """
+    Returns the 32-bit hashes of the word n-grams of text (one hash of the whole text if it has fewer words).
+    Hashes are stable across processes so signatures can be stored on disk.
+    """
+    words = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in text.lower().split()), dtype=np.uint64)
+    if 0 < len(words) < size:
+        # A single shingle of all the words, so short texts only match texts with the same words in order
+        combined = words[:1].copy()
+        for i in range(1, len(words)):
+            combined = combined * np.uint64(0x100000001B3) ^ words[i:i + 1]
+        return combined & np.uint64(0xFFFFFFFF)
+    if not len(words):
+        return words
+    combined = words[:len(words) - size + 1].copy()
+    for i in range(1, size):
+        combined = combined * np.uint64(0x100000001B3) ^ words[i:len(words) - size + 1 + i]
+    return combined & np.uint64(0xFFFFFFFF)
+
+def minhash(text):
+    """
+    Returns the MinHash signature of text: MINHASH_PERMUTATIONS uint32 values whose agreement
+    rate between two texts estimates the Jaccard similarity of their shingle sets.
+    """
+    hashes = shingles(text)
+    if not len(hashes):
+        return _EMPTY.copy()
+    permuted = (_HASH_A[:, None] * hashes[None, :] + _HASH_B[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+def similarity(sig_a, sig_b):
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing over MinHash signatures: signatures are split into bands and texts
+    sharing any band become candidates, which are then checked against the similarity threshold.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, bands=MINHASH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = []
+
+    def _keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, signature):
+        """
+        Returns the id of a stored signature at least threshold-similar to this one, or None.
+        """
+        checked = set()
+        for band, key in self._keys(signature):
+            for doc_id in self.buckets[band].get(key, ()):
+                if doc_id in checked:
+                    continue
+                checked.add(doc_id)
+                if similarity(signature, self.signatures[doc_id]) >= self.threshold:
+                    return doc_id
+        return None
+
+    def add(self, signature):
+        doc_id = len(self.signatures)
+        self.signatures.append(signature)
+        for band, key in self._keys(signature):
+            self.buckets[band].setdefault(key, []).append(doc_id)
+        return doc_id
+
+def _signature_path(source_id):
+    return os.path.join(CACHE_DIR, f"{source_id}.minhash.npz")
+
+def _chunk_key(text):
+    digest = hashlib.blake2b(f"{SIGNATURE_VERSION}\0{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def load_signatures(source_id):
+    """
+    Returns the stored signatures of a source's chunks as a dict of chunk text key to signature.
+    """
+    path = _signature_path(source_id)
+    if source_id is None or not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as data:
+            if data["signatures"].shape[1:] != (MINHASH_PERMUTATIONS,):
+                return {}
+            return dict(zip(data["keys"].tolist(), data["signatures"]))
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning("Ignoring unreadable signature store %s: %s", path, e)
+        return {}
+
+def save_signatures(source_id, signatures):
+    """
+    Stores a source's chunk signatures compactly: one uint64 text key and MINHASH_PERMUTATIONS uint32 values per chunk.
+    """
+    if source_id is None or not signatures:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    keys = np.fromiter(signatures.keys(), dtype=np.uint64, count=len(signatures))
+    values = np.vstack(list(signatures.values())).astype(np.uint32)
+    with open(_signature_path(source_id), "wb") as f:
+        np.savez(f, keys=keys, signatures=values)
+
+def iter_unique_records(records, threshold=DEDUP_THRESHOLD):
+    """
+    Filters (text, source_id, ...) chunk records, dropping chunks that are near-duplicates of an earlier
+    chunk from any source, e.g. re-uploads or recaps in multi-part lectures. Records from the same source
+    are expected to be consecutive; each source's signatures are kept in a per-video store on disk, so
+    only chunks not seen before are hashed again when sources are added.
+    """
+    lsh = LSHIndex(threshold)
+    kept = dropped = 0
+    for source_id, group in groupby(records, key=lambda record: record[1]):
+        stored = load_signatures(source_id)
+        signatures = {}
+        for record in group:
+            key = _chunk_key(record[0])
+            signature = stored.get(key)
+            if signature is None:
+                signature = minhash(record[0])
+            signatures[key] = signature
+            if lsh.query(signature) is not None:
+                dropped += 1
+                continue
+            lsh.add(signature)
+            kept += 1
+            yield record
+        if signatures.keys() != stored.keys():
+            save_signatures(source_id, signatures)
+    if dropped:
+        logging.info("Dropped %s near-duplicate chunks, kept %s.", dropped, kept)
@@ -1,53 +1,353 @@
-from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
 import os
 import pickle
 import logging
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from utils.bm25_utils import build_bm25
+from utils.tracing import span
+from utils.metrics import Counter, Gauge, record_model_memory
+from config import FAISS_INDEX, FAISS_SEARCH_PARAMS, INDEX_LOCK_PATH
 
 EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-mpnet-base-v2")
 VECTORSTORE_PATH = "cache/vectorstore.faiss"
 EMBEDDINGS_PATH = "cache/embeddings.pkl"
+BM25_PATH = "cache/bm25.pkl"
+MANIFEST_PATH = "cache/vectorstore.manifest"
+CHUNK_META_PATH = "cache/chunk_meta.npz"
+# One row per FAISS id: index into the saved source list, and the chunk's time range in seconds (NaN if unknown)
+CHUNK_META_DTYPE = np.dtype([("source", np.int32), ("start", np.float32), ("end", np.float32)])
+EMBED_BATCH_SIZE = 64
+
+EMBEDDED_CHUNKS = Counter("embedding_chunks_total", "Chunks encoded by the embedding model")
+EMBEDDING_RATE = Gauge("embedding_chunks_per_second", "Encoding throughput of the most recent batch")
+
+# Process-wide snapshot of the loaded store (see load_store), reused until the manifest changes
+_registry = {}
+_store_lock = threading.RLock()
+
+_model_lock = threading.Lock()
+_lock_state = threading.local()
 
-# Load embedding model once
 try:
-    embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-except Exception as e:
-    logging.error(f"Failed to load embedding model: {e}")
-    embedding_model = None
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+    _process_lock = threading.RLock()
+
+@lru_cache(maxsize=1)
+def _load_embedding_model():
+    try:
+        start = time.perf_counter()
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        logging.info("Loaded embedding model %s in %.1fs", EMBEDDING_MODEL_NAME, time.perf_counter() - start)
+        record_model_memory("embedding", model)
+        return model
+    except Exception as e:
+        logging.error("Failed to load embedding model: %s", e)
+        return None
+
+def get_embedding_model():
+    """
+    Returns the SentenceTransformer, importing and loading it on first use (once per process),
+    so importing this module stays cheap. Returns None if the model cannot be loaded.
+    """
+    with _model_lock:
+        return _load_embedding_model()
+
+@contextmanager
+def index_lock(exclusive=True):
+    """
+    Locks the on-disk store (cache/) against other threads and processes, e.g. the Streamlit app and the
+    API server working off the same job queue: exclusive to write or build-then-read the index, shared
+    to read it. Re-entering it in a thread that already holds it is a no-op. The lock file (INDEX_LOCK_PATH)
+    lives outside cache/ so cleanup_old_files never deletes it while it is held.
+    """
+    # A forked child inherits the parent's thread state but not its lock, hence the pid check
+    if getattr(_lock_state, "depth", 0) and _lock_state.pid == os.getpid():
+        _lock_state.depth += 1
+        try:
+            yield
+        finally:
+            _lock_state.depth -= 1
+        return
+    if fcntl is None:
+        with _process_lock:
+            _lock_state.depth, _lock_state.pid = 1, os.getpid()
+            try:
+                yield
+            finally:
+                _lock_state.depth = 0
+        return
+    if os.path.dirname(INDEX_LOCK_PATH):
+        os.makedirs(os.path.dirname(INDEX_LOCK_PATH), exist_ok=True)
+    with open(INDEX_LOCK_PATH, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        _lock_state.depth, _lock_state.pid = 1, os.getpid()
+        try:
+            yield
+        finally:
+            _lock_state.depth = 0
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def store_fingerprint(chunks, source_ids=None):
+    """
+    Returns a hash identifying a set of chunks and their source ids.
+    """
+    digest = hashlib.sha1(f"{EMBEDDING_MODEL_NAME}\0{FAISS_INDEX}".encode())
+    for i, chunk in enumerate(chunks):
+        source = source_ids[i] if source_ids is not None else ""
+        digest.update(f"{source}\0{chunk}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+def read_manifest():
+    """
+    Returns the manifest of the stored index ({"fingerprint", "chunks"}), or None if any store file is missing.
+    """
+    paths = [VECTORSTORE_PATH, EMBEDDINGS_PATH, BM25_PATH, CHUNK_META_PATH, MANIFEST_PATH]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_store_current(fingerprint):
+    """
+    Returns True if the index, chunks and BM25 files on disk were built for this fingerprint.
+    """
+    manifest = read_manifest()
+    return manifest is not None and manifest.get("fingerprint") == fingerprint
 
-def store_embeddings(chunks):
+def _records(chunks, source_ids):
+    """
+    Yields (text, source_id, start, end, embedding) for chunks given as strings (with an optional parallel
+    source_ids list), (text, source_id) pairs, (text, source_id, start, end) records, or records with a
+    fifth precomputed embedding (None means the chunk still has to be encoded).
+    """
+    for i, chunk in enumerate(chunks):
+        if isinstance(chunk, tuple):
+            text, source = chunk[0], chunk[1]
+            start, end = (chunk[2], chunk[3]) if len(chunk) > 3 else (None, None)
+            embedding = chunk[4] if len(chunk) > 4 else None
+            yield text, source, start, end, embedding
+        else:
+            yield chunk, source_ids[i] if source_ids is not None else None, None, None, None
+
+def build_chunk_metadata(sources, starts, ends):
+    """
+    Packs per-chunk source ids and time ranges into a compact structured array aligned with the FAISS ids.
+    Returns (metadata, source_names).
+    """
+    sources = ["" if name is None else str(name) for name in sources]
+    source_names = list(dict.fromkeys(sources))
+    positions = {name: i for i, name in enumerate(source_names)}
+    meta = np.empty(len(sources), dtype=CHUNK_META_DTYPE)
+    meta["source"] = [positions[name] for name in sources]
+    meta["start"] = [np.nan if t is None else t for t in starts]
+    meta["end"] = [np.nan if t is None else t for t in ends]
+    return meta, source_names
+
+def store_embeddings(chunks, source_ids=None, fingerprint=None, batch_size=EMBED_BATCH_SIZE):
     """
     Encodes text chunks, stores embeddings in a FAISS index, and saves both index and chunks to disk.
+    A BM25 keyword index and per-chunk metadata (source and time range) are saved next to the FAISS index.
+    chunks may be a list or any iterable, including a chunking generator yielding strings,
+    (text, source_id) pairs or (text, source_id, start, end[, embedding]) records; it is encoded in batches as it is consumed, so encoding starts before
+    chunking has finished. Skips re-encoding if the stored index was already built for the same
+    fingerprint (by default computed from a list of chunks and their sources).
+    Returns the number of chunks in the store, or None on failure.
     """
-    if embedding_model is None:
+    if get_embedding_model() is None:
         logging.error("Embedding model is not loaded.")
-        return
+        return None
+    if fingerprint is None and isinstance(chunks, list):
+        fingerprint = store_fingerprint(chunks, source_ids)
+    if fingerprint is not None:
+        manifest = read_manifest()
+        if manifest is not None and manifest.get("fingerprint") == fingerprint:
+            logging.info("Vectorstore already holds these %s chunks, skipping re-embedding.", manifest.get('chunks'))
+            return manifest.get("chunks")
     try:
-        embeddings = embedding_model.encode(chunks)
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(np.array(embeddings))
+        texts, sources, starts, ends, vectors, held = [], [], [], [], [], []
+        digest = hashlib.sha1(f"{EMBEDDING_MODEL_NAME}\0{FAISS_INDEX}".encode())
+        index = None
+        encoded = 0
+        for text, source, start, end, embedding in _records(chunks, source_ids):
+            texts.append(text)
+            vectors.append(embedding)
+            sources.append(source)
+            starts.append(start)
+            ends.append(end)
+            digest.update(f"{source if source is not None else ''}\0{text}\0".encode("utf-8"))
+            if len(texts) - encoded >= batch_size:
+                index = _add_batch(index, texts[encoded:], vectors[encoded:], held)
+                vectors[encoded:] = [None] * (len(texts) - encoded)
+                encoded = len(texts)
+        if len(texts) > encoded:
+            index = _add_batch(index, texts[encoded:], vectors[encoded:], held)
+        index = train_index(index, held)
+        if index is None:
+            logging.warning("No chunks to embed.")
+            return 0
+        bm25 = build_bm25(texts, sources)
+        meta, source_names = build_chunk_metadata(sources, starts, ends)
+        manifest = {"fingerprint": fingerprint or digest.hexdigest(), "chunks": len(texts)}
         os.makedirs("cache", exist_ok=True)
-        faiss.write_index(index, VECTORSTORE_PATH)
-        with open(EMBEDDINGS_PATH, "wb") as f:
-            pickle.dump(chunks, f)
-        logging.info(f"Stored {len(chunks)} embeddings and index.")
+        with index_lock(), _store_lock, span("write_index", chunks=len(texts)):
+            import faiss
+            faiss.write_index(index, VECTORSTORE_PATH)
+            with open(EMBEDDINGS_PATH, "wb") as f:
+                pickle.dump(texts, f)
+            with open(BM25_PATH, "wb") as f:
+                pickle.dump(bm25, f)
+            with open(CHUNK_META_PATH, "wb") as f:
+                np.savez(f, meta=meta, sources=np.array(source_names, dtype=str))
+            with open(MANIFEST_PATH, "w") as f:
+                json.dump(manifest, f)
+        logging.info("Stored %s embeddings and index.", len(texts))
+        return len(texts)
     except Exception as e:
-        logging.error(f"Failed to store embeddings: {e}")
+        logging.error("Failed to store embeddings: %s", e)
+        return None
 
-def load_vectorstore():
+def make_index(dim, factory=FAISS_INDEX):
     """
-    Loads the FAISS index and text chunks from disk. Returns (index, chunks) or (None, None) if not found.
+    Creates an empty L2 FAISS index from an index_factory string such as "Flat", "HNSW32" or "IVF256,Flat".
     """
-    if not os.path.exists(VECTORSTORE_PATH) or not os.path.exists(EMBEDDINGS_PATH):
-        logging.warning("Vectorstore or embeddings file not found.")
-        return None, None
+    import faiss
+    if factory in ("", "Flat"):
+        return faiss.IndexFlatL2(dim)
+    return faiss.index_factory(dim, factory)
+
+def train_index(index, held):
+    """
+    Trains an index that needs training (IVF) on the vectors held back while it was untrained, then adds them.
+    Falls back to a flat index if there are too few vectors to train it.
+    """
+    if index is None or not held:
+        return index
+    embeddings = np.vstack(held)
     try:
-        index = faiss.read_index(VECTORSTORE_PATH)
+        with span("train_index", vectors=len(embeddings)):
+            index.train(embeddings)
+    except RuntimeError as e:
+        logging.warning("Could not train %s on %s vectors, using a flat index: %s",
+                        type(index).__name__, len(embeddings), e)
+        index = make_index(embeddings.shape[1], "Flat")
+    index.add(embeddings)
+    return index
+
+def apply_search_params(index, params=FAISS_SEARCH_PARAMS):
+    """
+    Sets search-time parameters such as "nprobe=16" (IVF) or "efSearch=64" (HNSW) on a loaded index.
+    Parameters the index does not have (e.g. after falling back to a flat index) are ignored with a warning.
+    """
+    if params:
+        import faiss
+        try:
+            faiss.ParameterSpace().set_index_parameters(index, params)
+        except RuntimeError as e:
+            logging.warning("Ignoring FAISS search parameters %r for %s: %s", params, type(index).__name__, e)
+    return index
+
+def _add_batch(index, texts, vectors=None, held=None):
+    """
+    Adds a batch to the index, encoding only the texts that came without a precomputed embedding.
+    Indexes that must be trained first collect their batches in held until train_index is called.
+    """
+    vectors = list(vectors) if vectors is not None else [None] * len(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        with span("encode", chunks=len(missing), chars=sum(len(texts[i]) for i in missing)) as s:
+            encoded = get_embedding_model().encode([texts[i] for i in missing])
+        EMBEDDED_CHUNKS.inc(len(missing))
+        if s["duration_ms"] > 0:
+            EMBEDDING_RATE.set(len(missing) / (s["duration_ms"] / 1000))
+        for i, vector in zip(missing, encoded):
+            vectors[i] = vector
+    embeddings = np.asarray(np.vstack(vectors), dtype=np.float32)
+    if index is None:
+        index = make_index(embeddings.shape[1])
+    if index.is_trained:
+        index.add(embeddings)
+    else:
+        held.append(embeddings)
+    return index
+
+def _read_vectorstore():
+    import faiss
+    with span("read_index", bytes=os.path.getsize(VECTORSTORE_PATH)) as s:
+        index = apply_search_params(faiss.read_index(VECTORSTORE_PATH))
         with open(EMBEDDINGS_PATH, "rb") as f:
             chunks = pickle.load(f)
-        return index, chunks
+        s["chunks"] = len(chunks)
+    return index, chunks
+
+def _read_chunk_metadata():
+    with np.load(CHUNK_META_PATH) as data:
+        return data["meta"], [str(name) for name in data["sources"]]
+
+def _read_bm25():
+    with open(BM25_PATH, "rb") as f:
+        return pickle.load(f)
+
+def load_store():
+    """
+    Loads the stored index as one consistent snapshot: {"fingerprint", "index", "chunks", "bm25", "meta",
+    "source_names"}, where meta[i] holds the source position and time range of chunk i. The files are read
+    under a shared index_lock, so a rebuild in another thread or process cannot mix two versions, and the
+    snapshot is kept in memory and shared by all callers until the manifest's fingerprint changes.
+    Returns None if there is no complete store.
+    """
+    try:
+        with index_lock(exclusive=False):
+            manifest = read_manifest()
+            if manifest is None:
+                return None
+            with _store_lock:
+                store = _registry.get("store")
+                if store is not None and store["fingerprint"] == manifest.get("fingerprint"):
+                    return store
+                index, chunks = _read_vectorstore()
+                meta, source_names = _read_chunk_metadata()
+                store = {"fingerprint": manifest.get("fingerprint"), "index": index, "chunks": chunks,
+                         "bm25": _read_bm25(), "meta": meta, "source_names": source_names}
+                _registry["store"] = store
+                return store
     except Exception as e:
-        logging.error(f"Failed to load vectorstore: {e}")
+        logging.error("Failed to load vectorstore: %s", e)
+        return None
+
+def load_vectorstore():
+    """
+    Loads the FAISS index and text chunks from disk. Returns (index, chunks) or (None, None) if not found.
+    The loaded index is kept in memory and shared by all callers (see load_store).
+    """
+    store = load_store()
+    if store is None:
+        logging.warning("Vectorstore or embeddings file not found.")
         return None, None
+    return store["index"], store["chunks"]
+
+def load_bm25():
+    """
+    Loads the BM25 index saved by store_embeddings. Returns None if it is missing or unreadable.
+    """
+    store = load_store()
+    return store["bm25"] if store is not None else None
+
+def load_chunk_metadata():
+    """
+    Loads the per-chunk metadata saved by store_embeddings.
+    Returns (metadata, source_names), where metadata[i] holds the source position and time range of chunk i,
+    or (None, None) if it is missing.
+    """
+    store = load_store()
+    return (store["meta"], store["source_names"]) if store is not None else (None, None)
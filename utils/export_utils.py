@@ -0,0 +1,154 @@
+"""
+Exports answers ({"question", "answer", "sources", "latency_ms"} dicts, as yielded by qa_chain.ask_questions)
+to JSONL, CSV or Markdown for downstream analysis. Answers are consumed one at a time and each is written
+as soon as it arrives, so a generator of answers is never held in memory and a cut-short export keeps
+what was answered.
+
+    with open("answers.jsonl", "w", encoding="utf-8") as f:
+        export_answers(ask_questions(questions), f, "jsonl")
+"""
+import io
+import csv
+import json
+import os
+
+FORMATS = {"jsonl": "application/x-ndjson", "csv": "text/csv", "md": "text/markdown"}
+# Stages that get a <stage>_ms column in CSV exports; JSONL and Markdown keep every stage
+LATENCY_STAGES = ("embed_query", "faiss_search", "bm25_search", "rerank", "llm_call")
+CSV_COLUMNS = ["question", "answer", "sources", "chunk_ids", "scores", "timestamps",
+               *(f"{stage}_ms" for stage in LATENCY_STAGES)]
+
+
+def format_for(path, default="jsonl"):
+    """
+    Returns the export format for a file name from its extension (.jsonl/.json, .csv, .md), or default.
+    """
+    ext = os.path.splitext(path or "")[1].lower().lstrip(".")
+    ext = {"json": "jsonl", "ndjson": "jsonl", "markdown": "md"}.get(ext, ext)
+    return ext if ext in FORMATS else default
+
+
+def _clock(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+def _span(source):
+    if source.get("start") is None:
+        return ""
+    end = source.get("end")
+    return f"{source['start']:.1f}-{end:.1f}" if end is not None else f"{source['start']:.1f}"
+
+
+def _score(value):
+    return "" if value is None else f"{value:.4f}"
+
+
+def _seconds(value):
+    # Chunk times are stored as float32, so 134.4 comes back as 134.39999389648438
+    return None if value is None else round(value, 3)
+
+
+def answer_record(answer):
+    """
+    Returns the exported fields of one answer: question, answer, sources (chunk_id, source_id, start, end,
+    url and score of each chunk used) and latency_ms per stage.
+    """
+    return {
+        "question": answer["question"],
+        "answer": answer["answer"],
+        "sources": [
+            {"chunk_id": source.get("chunk_id"), "source_id": source.get("source_id"),
+             "start": _seconds(source.get("start")), "end": _seconds(source.get("end")),
+             "url": source.get("url"), "score": source.get("score")}
+            for source in answer.get("sources", [])
+        ],
+        "latency_ms": dict(answer.get("latency_ms") or {}),
+    }
+
+
+def _jsonl(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _csv(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(CSV_COLUMNS)
+    yield take()
+    for record in records:
+        sources = record["sources"]
+        latency = record["latency_ms"]
+        writer.writerow([
+            record["question"],
+            record["answer"],
+            # The links column of the earlier CSV export, so existing consumers keep working
+            " ".join(dict.fromkeys(source["url"] for source in sources if source["url"])),
+            " ".join(str(source["chunk_id"]) for source in sources),
+            " ".join(_score(source["score"]) or "-" for source in sources),
+            " ".join(_span(source) or "-" for source in sources),
+            *(latency.get(stage, "") for stage in LATENCY_STAGES),
+        ])
+        yield take()
+
+
+def _markdown(records):
+    yield "# Q&A export\n"
+    for number, record in enumerate(records, start=1):
+        lines = [f"\n## {number}. {record['question']}\n", f"\n{record['answer']}\n"]
+        if record["sources"]:
+            lines.append("\n**Sources:**\n\n")
+            for source in record["sources"]:
+                label = source["source_id"] or "unknown source"
+                if source["start"] is not None:
+                    label += f" @ {_clock(source['start'])}"
+                link = f"[{label}]({source['url']})" if source["url"] else label
+                score = f", score {_score(source['score'])}" if source["score"] is not None else ""
+                lines.append(f"- {link} (chunk {source['chunk_id']}{score})\n")
+        if record["latency_ms"]:
+            timings = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in record["latency_ms"].items())
+            lines.append(f"\n_Latency: {timings}_\n")
+        yield "".join(lines)
+
+
+_WRITERS = {"jsonl": _jsonl, "csv": _csv, "md": _markdown}
+
+
+def iter_export(answers, fmt="jsonl"):
+    """
+    Yields the export of answers in fmt ("jsonl", "csv" or "md") as text pieces, one per answer
+    (after a header for CSV and Markdown), e.g. for a streaming HTTP response.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    return _WRITERS[fmt](answer_record(answer) for answer in answers)
+
+
+def export_answers(answers, out, fmt=None):
+    """
+    Writes answers to out, a text file opened with newline="" (for CSV) or a path, flushing after each answer.
+    The format defaults to the path's extension. Returns the number of answers written.
+    """
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "w", newline="", encoding="utf-8") as f:
+            return export_answers(answers, f, fmt or format_for(out))
+    count = 0
+
+    def counted():
+        nonlocal count
+        for answer in answers:
+            count += 1
+            yield answer
+
+    for piece in iter_export(counted(), fmt or "jsonl"):
+        out.write(piece)
+        out.flush()
+    return count
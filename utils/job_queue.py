@@ -0,0 +1,234 @@
+"""
+Persistent job queue backed by a SQLite table, with a pool of worker threads per process.
+Jobs outlive Streamlit reruns, browser sessions and restarts: callers submit a job, keep its id and poll it.
+Handlers are registered per job kind and called as handler(payload, notify) -> JSON-serializable result.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+from config import JOBS_DB_PATH, JOB_POLL_SECONDS
+from utils.tracing import span
+from utils.logging_utils import get_log_context, log_context
+from utils.metrics import Counter, Gauge
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress TEXT,
+    dedup_key TEXT,
+    owner INTEGER,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status);
+"""
+
+class JobError(Exception):
+    """
+    Raised by handlers for expected failures; the message is shown to the user as the job's error.
+    """
+
+_handlers = {}
+_schema_ready = set()
+_wakeup = threading.Event()
+_stop = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+JOBS_FINISHED = Counter("jobs_finished_total", "Jobs run by this process, by kind and final status", ["kind", "status"])
+JOBS_PENDING = Gauge("jobs_pending", "Jobs in the queue table by status", ["status"])
+
+@contextmanager
+def _connect(path=None):
+    path = path or JOBS_DB_PATH
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if path not in _schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            _schema_ready.add(path)
+        yield conn
+    finally:
+        conn.close()
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+def register(kind, handler):
+    """
+    Registers the function that runs jobs of this kind.
+    """
+    _handlers[kind] = handler
+
+def submit(kind, payload, dedup_key=None, reuse_seconds=None):
+    """
+    Queues a job and returns its id. With a dedup_key, an identical job that is still queued or running
+    is returned instead, as is one that finished successfully less than reuse_seconds ago (if given).
+    """
+    now = time.time()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if dedup_key is not None:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE dedup_key = ? AND (status IN ('queued', 'running') "
+                    "OR (status = 'done' AND updated >= ?)) ORDER BY created DESC LIMIT 1",
+                    (dedup_key, now - reuse_seconds if reuse_seconds is not None else float("inf")),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return row["id"]
+            job_id = uuid.uuid4().hex
+            # The submitter's request/session ids travel with the job, so the worker's logs can be traced back
+            payload = dict(payload, log_context=get_log_context())
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, dedup_key, created, updated) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), dedup_key, now, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    _wakeup.set()
+    return job_id
+
+def get_job(job_id):
+    """
+    Returns a job as a dict (id, kind, status, payload, result, error, progress, created, updated), or None.
+    Status is one of queued, running, done or failed.
+    """
+    with _connect() as conn:
+        return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+def count_jobs(status):
+    """
+    Returns the number of jobs with this status, across all processes sharing the table.
+    """
+    with _connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+def _update(job_id, **fields):
+    fields["updated"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+def _claim(kinds):
+    """
+    Atomically marks the oldest queued job of the given kinds as running by this process and returns it.
+    """
+    placeholders = ", ".join("?" for _ in kinds)
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            f"SELECT * FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) ORDER BY created LIMIT 1",
+            tuple(kinds),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE jobs SET status = 'running', owner = ?, updated = ? WHERE id = ?",
+                     (os.getpid(), time.time(), row["id"]))
+        conn.execute("COMMIT")
+    return _row_to_job(row)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+def requeue_orphans():
+    """
+    Puts running jobs whose owning process has exited back in the queue, e.g. after a crash or redeploy.
+    """
+    with _connect() as conn:
+        rows = conn.execute("SELECT id, owner FROM jobs WHERE status = 'running'").fetchall()
+    orphans = [row["id"] for row in rows if row["owner"] != os.getpid() and not _pid_alive(row["owner"])]
+    for job_id in orphans:
+        _update(job_id, status="queued", owner=None, progress="Requeued after worker restart")
+    if orphans:
+        logging.info("Requeued %s orphaned jobs.", len(orphans))
+
+def _run(job):
+    handler = _handlers[job["kind"]]
+
+    def notify(level, message):
+        getattr(logging, level, logging.info)("Job %s: %s", job["id"], message)
+        _update(job["id"], progress=message)
+
+    start = time.perf_counter()
+    try:
+        with span(f"job_{job['kind']}", job_id=job["id"]):
+            result = handler(job["payload"], notify)
+        _update(job["id"], status="done", result=json.dumps(result), progress=None)
+        JOBS_FINISHED.inc(kind=job["kind"], status="done")
+        logging.info("Job %s (%s) done in %.1fs", job['id'], job['kind'], time.perf_counter() - start)
+    except JobError as e:
+        _update(job["id"], status="failed", error=str(e), progress=None)
+        JOBS_FINISHED.inc(kind=job["kind"], status="failed")
+    except Exception as e:
+        logging.error("Job %s (%s) failed: %s", job['id'], job['kind'], e)
+        _update(job["id"], status="failed", error=f"[ERROR] {e}", progress=None)
+        JOBS_FINISHED.inc(kind=job["kind"], status="failed")
+
+def _worker_loop():
+    while not _stop.is_set():
+        try:
+            job = _claim(list(_handlers))
+        except sqlite3.Error as e:
+            logging.warning("Job queue unavailable: %s", e)
+            job = None
+        if job is None:
+            _wakeup.wait(JOB_POLL_SECONDS)
+            _wakeup.clear()
+            continue
+        with log_context(**{**(job["payload"].get("log_context") or {}), "job_id": job["id"]}):
+            _run(job)
+
+def start_workers(count):
+    """
+    Starts count worker threads in this process, once; later calls (e.g. on every Streamlit rerun) are no-ops.
+    Workers pick up jobs of every registered kind, including ones queued by other processes.
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        _stop.clear()
+        requeue_orphans()
+        for i in range(count):
+            worker = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+def stop_workers():
+    """
+    Asks the worker threads to exit after their current job.
+    """
+    with _workers_lock:
+        _stop.set()
+        _wakeup.set()
+        _workers.clear()
+
+JOBS_PENDING.set_function(lambda: count_jobs("queued"), status="queued")
+JOBS_PENDING.set_function(lambda: count_jobs("running"), status="running")
@@ -0,0 +1,121 @@
+"""
+Ingestion and question-answering jobs for the persistent job queue (see utils.job_queue),
+used by the Streamlit app and the API server so long-running work is not tied to a request or script run.
+"""
+import os
+import json
+import hashlib
+
+from config import JOB_WORKERS, JOB_REUSE_SECONDS, TEMP_AUDIO_DIR
+from utils import job_queue
+from utils.job_queue import JobError
+
+def _dedup_key(kind, **fields):
+    return kind + ":" + hashlib.sha1(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+def _ingest(sources, audio_path, notify):
+    from utils.pipeline import ingest_sources, ingest_audio
+    if audio_path:
+        # Only uploads saved by the app are transcribed, never arbitrary files on the server
+        uploads = os.path.realpath(TEMP_AUDIO_DIR)
+        if os.path.commonpath([uploads, os.path.realpath(audio_path)]) != uploads:
+            raise JobError("Audio files must be uploaded.")
+    results = ingest_sources(sources, notify=notify)
+    if audio_path:
+        results.append(ingest_audio(audio_path, notify))
+    return results
+
+def run_ingest(payload, notify):
+    """
+    Ingests sources into the transcript cache and optionally builds the index from them.
+    """
+    from utils.pipeline import build_index
+    from utils.embedding_utils import index_lock, load_store
+    results = _ingest(payload["sources"], payload.get("audio_path"), notify)
+    summary = [
+        {"source": r["source"], "source_id": r["source_id"], "cached": r["cached"], "error": r["error"]}
+        for r in results
+    ]
+    chunks = 0
+    if payload.get("index", True):
+        # The index in cache/ is shared by every app and server process that takes jobs from the queue
+        with index_lock():
+            chunks = build_index(results)["chunks"]
+    return {"sources": summary, "chunks": chunks}
+
+def run_qa(payload, notify):
+    """
+    Ingests the sources, builds the index and answers the questions. Batch answers are also streamed
+    to a CSV file as they arrive (see export_utils). Returns
+    {"answers": [{question, answer, sources, latency_ms}], "results_path": path or None}.
+    """
+    from utils.pipeline import build_index
+    from utils.qa_chain import ask_question, ask_questions
+    from utils.tracing import collect_latencies
+    from utils.export_utils import export_answers
+    from utils.embedding_utils import index_lock, load_store
+    results = _ingest(payload["sources"], payload.get("audio_path"), notify)
+    if not any(r["transcript"] for r in results):
+        raise JobError("No valid transcripts found. Please provide a valid YouTube link or upload an audio file.")
+    questions = payload["questions"]
+    answers = []
+    results_path = None
+    # Held only while building the index and taking a snapshot of it, so no other job or process replaces the
+    # index in between; answering from the snapshot does not block readers or other jobs
+    with index_lock():
+        notify("info", "Generating embeddings...")
+        build_index(results)
+        store = load_store()
+    if payload.get("single", len(questions) == 1):
+        notify("info", "Answering your question...")
+        with collect_latencies() as latency_ms:
+            answer, sources = ask_question(questions[0], top_k=payload.get("top_k", 5), return_sources=True,
+                                           store=store)
+        answers.append({"question": questions[0], "answer": answer, "sources": sources, "latency_ms": latency_ms})
+    else:
+        os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
+        results_path = os.path.join(TEMP_AUDIO_DIR, f"batch_answers_{payload['job_key']}.csv")
+        def progress(results):
+            for done, result in enumerate(results, start=1):
+                answers.append(result)
+                notify("info", f"Answered {done}/{len(questions)} questions")
+                yield result
+
+        # Answers are written to disk as they arrive so large batches can be downloaded even if cut short.
+        # The index was just built from exactly this job's sources, so retrieval needs no source filter
+        export_answers(progress(ask_questions(questions, top_k=payload.get("top_k", 5), store=store)),
+                       results_path, "csv")
+    return {"answers": answers, "results_path": results_path}
+
+def submit_ingest(sources, index=True, audio_path=None):
+    """
+    Queues an ingest job and returns its id, or the id of an identical job that is still queued or running.
+    """
+    payload = {"sources": list(sources), "audio_path": audio_path, "index": index}
+    return job_queue.submit("ingest", payload, _dedup_key("ingest", **payload))
+
+def submit_qa(sources, questions, audio_path=None, single=True, top_k=5):
+    """
+    Queues a question-answering job and returns its id. An identical request (same sources, audio content,
+    questions and settings) reuses a job that is running or finished within JOB_REUSE_SECONDS, across sessions.
+    """
+    from utils.source_keys import audio_key, video_id
+    fields = {
+        "sources": [video_id(s) or s for s in sources],
+        "audio": audio_key(audio_path) if audio_path else None,
+        "questions": list(questions),
+        "single": single,
+        "top_k": top_k,
+    }
+    key = _dedup_key("qa", **fields)
+    payload = {"sources": list(sources), "audio_path": audio_path, "questions": list(questions),
+               "single": single, "top_k": top_k, "job_key": key.split(":", 1)[1][:16]}
+    return job_queue.submit("qa", payload, key, reuse_seconds=JOB_REUSE_SECONDS)
+
+def start(workers=JOB_WORKERS):
+    """
+    Registers the job handlers and starts this process's worker threads (once per process).
+    """
+    job_queue.register("ingest", run_ingest)
+    job_queue.register("qa", run_qa)
+    job_queue.start_workers(workers)
@@ -0,0 +1,149 @@
+"""
+Logging for the app, CLI and API server, set up once per process by configure_logging().
+
+Loggers only put records on an in-memory queue; a background listener thread formats and writes them,
+so a slow disk or terminal never blocks a request. The log file (LOG_FILE) holds one JSON object per line
+and rotates by size, or by time with LOG_ROTATE_WHEN. Every record carries the request, session and job ids
+and the tracing trace id of the code that logged it (see log_context). Log with %-style arguments,
+logging.info("Stored %s chunks", n), so messages below the level are never formatted.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from config import LOG_LEVEL, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN
+from utils.tracing import current_trace_id
+
+CONTEXT_FIELDS = ("request_id", "session_id", "job_id")
+
+_context = {name: contextvars.ContextVar(name, default=None) for name in CONTEXT_FIELDS}
+_listener = None
+_lock = threading.Lock()
+
+
+def get_log_context():
+    """
+    Returns the ids set for the current thread or task, e.g. to hand them to work that runs elsewhere.
+    """
+    return {name: var.get() for name, var in _context.items() if var.get() is not None}
+
+
+def set_log_context(**ids):
+    """
+    Sets ids (request_id, session_id, job_id) for everything the current thread or task logs from now on.
+    """
+    for name, value in ids.items():
+        _context[name].set(value)
+
+
+@contextmanager
+def log_context(**ids):
+    """
+    Sets ids for the records logged inside the block, restoring the previous ids afterwards.
+    """
+    tokens = [(_context[name], _context[name].set(value)) for name, value in ids.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Stamps records with the ids of the thread that logged them, before they cross the queue.
+    """
+    def filter(self, record):
+        for name, var in _context.items():
+            setattr(record, name, var.get())
+        record.trace_id = current_trace_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object: time, level, logger, message, the context ids that are set,
+    the span of tracing records and any exception.
+    """
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for name in (*CONTEXT_FIELDS, "trace_id"):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        span = getattr(record, "span", None)
+        if span is not None:
+            entry["span"] = span
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    The console format: time, level and message, followed by whichever context ids are set.
+    """
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        ids = " ".join(f"{name}={getattr(record, name)}" for name in CONTEXT_FIELDS if getattr(record, name, None))
+        return f"{text} [{ids}]" if ids else text
+
+
+def _file_handler(path):
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT,
+                                                            encoding="utf-8", delay=True)
+    else:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                                       encoding="utf-8", delay=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def configure_logging(level=None, log_file=LOG_FILE, console=True):
+    """
+    Routes the root logger through a queue to a rotating JSON log file and the console. Only the first call
+    in a process installs the handlers (later ones, e.g. on every Streamlit rerun, only apply level).
+    Tracing spans go to the file only, so the console stays readable.
+    """
+    global _listener
+    level = level or LOG_LEVEL
+    root = logging.getLogger()
+    with _lock:
+        if _listener is not None:
+            root.setLevel(level)
+            return
+        handlers = []
+        if log_file:
+            handlers.append(_file_handler(log_file))
+        if console:
+            stream = logging.StreamHandler()
+            stream.setFormatter(TextFormatter())
+            stream.addFilter(lambda record: record.name != "trace")
+            handlers.append(stream)
+        records = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        queue_handler.addFilter(ContextFilter())
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(_listener.stop)
@@ -0,0 +1,274 @@
+"""
+In-process metrics registry (counters, gauges and histograms) rendered in the Prometheus text format,
+so any Prometheus-compatible scraper, or plain curl, can read them. The API server serves them at GET /metrics;
+the Streamlit app serves them on METRICS_HOST:METRICS_PORT (see start_http_server).
+
+    CACHE = Counter("transcript_cache_requests_total", "Transcript cache lookups", ["result"])
+    CACHE.inc(result="hit")
+    render()  # -> 'transcript_cache_requests_total{result="hit"} 1.0\\n...'
+"""
+import os
+import math
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus' default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = []
+_registry_lock = threading.Lock()
+_server = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Metrics without labels are exported from the start, so rates work from the first scrape
+            self._values[()] = self._initial()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _initial(self):
+        return 0.0
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up, e.g. requests or errors.
+    """
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. set_function registers a callback evaluated at scrape time,
+    for values that are cheaper to read on demand (memory, directory sizes, queue depth).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, fn, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels):
+        return dict((key, value) for _, key, _, value in self._samples()).get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                value = fn()
+            except Exception as e:
+                logging.warning("Metric %s callback failed: %s", self.name, e)
+                continue
+            if value is not None:
+                values[key] = float(value)
+        return [(self.name, key, (), value) for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """
+    Counts observations (latencies, ratios) into cumulative buckets, with their sum and count.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labelnames)
+
+    def _initial(self):
+        return [[0] * len(self.buckets), 0.0, 0]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = self._initial()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", key, (("le", _format_value(bound)),), bucket_count))
+                samples.append((f"{self.name}_sum", key, (), total))
+                samples.append((f"{self.name}_count", key, (), count))
+        return samples
+
+
+def render():
+    """
+    Returns all registered metrics in the Prometheus text exposition format.
+    """
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+def directory_size(path):
+    """
+    Returns the total size in bytes of the files under path (0 if it does not exist).
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def module_memory(model):
+    """
+    Returns the bytes held by a torch model's parameters and buffers, or None if it is not a torch module.
+    """
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if module is None or not hasattr(module, "parameters"):
+        return None
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def process_memory():
+    """
+    Returns this process's resident memory in bytes, or None where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """
+    Serves GET /metrics on host:port from a daemon thread. Only the first call in a process does anything
+    (later ones, e.g. on every Streamlit rerun, are no-ops). Returns the bound port, or None if port is 0
+    or the port is taken, e.g. by another app process.
+    """
+    global _server
+    with _registry_lock:
+        if _server is not None:
+            return _server.server_address[1] if _server else None
+        _server = False
+        if not port:
+            return None
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:
+            logging.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+            return None
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logging.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return _server.server_address[1]
+
+
+def record_model_memory(name, model):
+    """
+    Sets model_memory_bytes for a freshly loaded model, if its size can be measured.
+    """
+    try:
+        size = module_memory(model)
+    except Exception as e:
+        logging.warning("Could not measure %s model memory: %s", name, e)
+        return
+    if size is not None:
+        MODEL_MEMORY.set(size, model=name)
+
+
+PROCESS_MEMORY = Gauge("process_resident_memory_bytes", "Resident memory of this process")
+PROCESS_MEMORY.set_function(process_memory)
+MODEL_MEMORY = Gauge("model_memory_bytes", "Parameter and buffer memory of each loaded model", ["model"])
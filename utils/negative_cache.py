@@ -0,0 +1,60 @@
+import os
+import json
+import time
+import logging
+
+from config import CACHE_DIR, NEGATIVE_CACHE_TTL_SECONDS, NEGATIVE_CACHE_MAX_TTL_SECONDS
+
+def _failure_path(source_id):
+    return os.path.join(CACHE_DIR, f"{source_id}.failed.json")
+
+def get_failure(source_id):
+    """
+    Returns the recorded failure for a source while its backoff has not expired
+    (a dict with reason, failures, last_failure and retry_at), or None if it may be retried.
+    """
+    path = _failure_path(source_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable failure record %s: %s", path, e)
+        return None
+    if time.time() >= entry.get("retry_at", 0):
+        return None
+    return entry
+
+def record_failure(source_id, reason):
+    """
+    Remembers that ingesting a source failed. The source is skipped for NEGATIVE_CACHE_TTL_SECONDS,
+    doubling with every further failure up to NEGATIVE_CACHE_MAX_TTL_SECONDS.
+    """
+    path = _failure_path(source_id)
+    failures = 0
+    try:
+        with open(path, "r") as f:
+            failures = json.load(f).get("failures", 0)
+    except (OSError, ValueError):
+        pass
+    failures += 1
+    ttl = min(NEGATIVE_CACHE_TTL_SECONDS * 2 ** (failures - 1), NEGATIVE_CACHE_MAX_TTL_SECONDS)
+    now = time.time()
+    entry = {"reason": reason, "failures": failures, "last_failure": now, "retry_at": now + ttl}
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(entry, f)
+    logging.info("Recorded failure #%s for %s; retrying after %ss.", failures, source_id, int(ttl))
+    return entry
+
+def clear_failure(source_id):
+    """
+    Forgets a source's failures, e.g. after it was ingested successfully.
+    """
+    path = _failure_path(source_id)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.warning("Failed to remove %s: %s", path, e)
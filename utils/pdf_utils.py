@@ -1,56 +1,107 @@
-from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
 from fpdf import FPDF
+import os
 import io
 import logging
 
-def get_transcript_or_generate(video_id, audio_path=None, languages=['en', 'hi']):
+from config import PDF_FONT_PATHS
+from utils.tracing import span
+
+
+def _available_fonts():
+    return [path for path in PDF_FONT_PATHS if os.path.isfile(path)]
+
+
+class ChatPdf:
     """
-    Attempts to fetch a transcript for a YouTube video in preferred languages, falling back to Hindi if needed.
-    Handles errors gracefully and logs issues. If audio_path is provided, uses audio transcription logic.
+    A chat-history PDF that grows with the conversation. Wrapping text into lines is nearly all of the
+    layout work, so add() wraps only the turns it has not seen yet and keeps their lines; write() then
+    only places the cached lines on fresh pages. Text is set in the TrueType fonts of PDF_FONT_PATHS (the first
+    one found, with the others as fallbacks for scripts it lacks, e.g. Devanagari); without any, it falls back
+    to Helvetica, replacing what latin-1 cannot encode.
     """
-    if video_id:
-        try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=languages)
-            return " ".join([t['text'] for t in transcript])
-        except NoTranscriptFound:
+    def __init__(self):
+        self.fonts = _available_fonts()
+        if not self.fonts:
+            logging.warning("No font from PDF_FONT_PATHS found; non-latin-1 characters are replaced in the PDF")
+        self.lines = []
+        # Only measures text, it is never written
+        self._measure = self._new_document()
+
+    @property
+    def turns(self):
+        return len(self.lines)
+
+    def _new_document(self):
+        pdf = FPDF()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        if not self.fonts:
+            pdf.set_font("Helvetica", size=12)
+        else:
+            names = [f"font{i}" for i in range(len(self.fonts))]
+            for name, path in zip(names, self.fonts):
+                pdf.add_font(name, "", path)
+            pdf.set_fallback_fonts(names[1:])
             try:
-                transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['hi'])
-                return " ".join([t['text'] for t in transcript])
+                # Shapes complex scripts (conjuncts, vowel signs); needs the optional uharfbuzz package
+                pdf.set_text_shaping(True)
             except Exception as e:
-                logging.warning(f"No transcript found for video {video_id} in preferred languages: {e}")
-                return f"[ERROR] No transcript found for video {video_id} in preferred languages."
-        except TranscriptsDisabled:
-            logging.warning(f"Transcripts are disabled for video {video_id}.")
-            return f"[ERROR] Transcripts are disabled for this video."
-        except Exception as e:
-            logging.error(f"Error fetching transcript for video {video_id}: {e}")
-            return f"[ERROR] Error fetching transcript: {e}"
-    elif audio_path:
-        # Placeholder for audio transcription logic
-        logging.warning("Audio transcription logic not implemented in pdf_utils.py.")
-        return "[ERROR] Audio transcription not implemented."
-    else:
-        logging.error("No video_id or audio_path provided to get_transcript_or_generate.")
-        return "[ERROR] No video_id or audio_path provided."
+                logging.debug("PDF text shaping unavailable: %s", e)
+            pdf.set_font(names[0], size=12)
+        pdf.add_page()
+        return pdf
+
+    def _wrap(self, text):
+        text = str(text)
+        if not self.fonts:
+            text = text.encode("latin-1", "replace").decode("latin-1")
+        return self._measure.multi_cell(0, 10, text, dry_run=True, output="LINES")
+
+    def add(self, chat_history):
+        """
+        Wraps the (question, answer) turns of chat_history added since the last call.
+        """
+        new_turns = chat_history[self.turns:]
+        if not new_turns:
+            return
+        with span("pdf_layout", turns=len(new_turns)):
+            self.lines.extend((self._wrap(f"Q: {q}"), self._wrap(f"A: {a}")) for q, a in new_turns)
+
+    def write(self, path):
+        """
+        Writes the turns added so far to path (a file path or a binary file object).
+        """
+        with span("pdf_write", turns=self.turns):
+            pdf = self._new_document()
+            for question_lines, answer_lines in self.lines:
+                pdf.set_text_color(0, 0, 128)
+                for line in question_lines:
+                    pdf.cell(0, 10, line, new_x="LMARGIN", new_y="NEXT")
+                pdf.set_text_color(0, 0, 0)
+                for line in answer_lines:
+                    pdf.cell(0, 10, line, new_x="LMARGIN", new_y="NEXT")
+                pdf.ln()
+            pdf.output(path)
+        return path
+
+
+def export_pdf(chat_pdf, chat_history, path):
+    """
+    Brings chat_pdf up to date with chat_history and writes it to path. Starts over if the history
+    got shorter (e.g. it was cleared). Returns the ChatPdf to keep for the next export.
+    """
+    if chat_pdf is None or len(chat_history) < chat_pdf.turns:
+        chat_pdf = ChatPdf()
+    chat_pdf.add(chat_history)
+    chat_pdf.write(path)
+    return chat_pdf
 
 
 def generate_pdf(chat_history):
     """
     Generates a PDF from chat history (list of (question, answer) tuples) and returns it as bytes.
     """
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Arial", size=12)
-
-    for q, a in chat_history:
-        pdf.set_text_color(0, 0, 128)
-        pdf.multi_cell(0, 10, f"Q: {q}")
-        pdf.set_text_color(0, 0, 0)
-        pdf.multi_cell(0, 10, f"A: {a}")
-        pdf.ln()
-
-    pdf_bytes = pdf.output(dest='S').encode('latin1')
-    pdf_output = io.BytesIO(pdf_bytes)
-    pdf_output.seek(0)
-    return pdf_output.read()
+    chat_pdf = ChatPdf()
+    chat_pdf.add(chat_history)
+    pdf_output = io.BytesIO()
+    chat_pdf.write(pdf_output)
+    return pdf_output.getvalue()
@@ -0,0 +1,502 @@
+"""
+Ingestion and indexing pipeline shared by the Streamlit app and the command-line interface.
+Nothing here depends on Streamlit; progress messages go through an optional notify(level, message) callback.
+"""
+import os
+import time
+import hashlib
+import json
+import logging
+import contextlib
+import contextvars
+import csv
+import io
+import wave
+import re
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import (CACHE_DIR, TEMP_AUDIO_DIR, CHUNKING_MODE, DEDUP_CHUNKS, DEDUP_THRESHOLD,
+                    INGEST_MAX_WORKERS, PLAYLIST_CACHE_SECONDS)
+from utils.metrics import Counter, Gauge, directory_size
+
+AUDIO_EXTENSIONS = (".mp3", ".mp4", ".wav", ".m4a")
+CLEANUP_INTERVAL_SECONDS = 3600
+
+_last_cleanup = None
+
+TRANSCRIPT_CACHE = Counter("transcript_cache_requests_total", "Transcript cache lookups by result", ["result"])
+DIRECTORY_BYTES = Gauge("directory_size_bytes", "Size of the cache and temporary audio directories", ["directory"])
+DIRECTORY_BYTES.set_function(lambda: directory_size(CACHE_DIR), directory=CACHE_DIR)
+DIRECTORY_BYTES.set_function(lambda: directory_size(TEMP_AUDIO_DIR), directory=TEMP_AUDIO_DIR)
+
+
+def _log_notify(level, message):
+    getattr(logging, level, logging.info)(message)
+
+
+def cleanup_if_due():
+    """
+    Runs cleanup_old_files at most once per CLEANUP_INTERVAL_SECONDS in this process,
+    instead of on every Streamlit rerun.
+    """
+    global _last_cleanup
+    now = time.time()
+    if _last_cleanup is not None and now - _last_cleanup < CLEANUP_INTERVAL_SECONDS:
+        return
+    from utils.cleanup_utils import cleanup_old_files
+    cleanup_old_files()
+    _last_cleanup = now
+
+
+def is_audio_path(source):
+    return source.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(source)
+
+
+def _looks_like_local_file(source):
+    return source.lower().endswith(AUDIO_EXTENSIONS) and "://" not in source
+
+
+def read_sources_file(path):
+    """
+    Reads URLs or audio paths from a text file, one per line. Blank lines and lines starting with # are skipped.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def parse_questions(text, csv_format=True):
+    """
+    Parses questions from CSV text (the 'question' column if present, otherwise the first column),
+    or from plain text with one question per line.
+    """
+    if not csv_format:
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "question" in header:
+        column = header.index("question")
+        rows = rows[1:]
+    else:
+        column = 0
+    return [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+
+
+def get_audio_duration(audio_path):
+    """
+    Returns the duration of an audio file in seconds, or None if it cannot be determined.
+    """
+    try:
+        if audio_path.endswith('.mp3'):
+            from mutagen.mp3 import MP3
+            return MP3(audio_path).info.length
+        elif audio_path.endswith('.m4a'):
+            from mutagen.mp4 import MP4
+            return MP4(audio_path).info.length
+        elif audio_path.endswith('.wav'):
+            with contextlib.closing(wave.open(audio_path, 'r')) as f:
+                return f.getnframes() / float(f.getframerate())
+    except Exception:
+        return None
+    return None
+
+
+def _read_cache(cache_file):
+    if os.path.exists(cache_file):
+        TRANSCRIPT_CACHE.inc(result="hit")
+        with open(cache_file, "r") as f:
+            return f.read()
+    TRANSCRIPT_CACHE.inc(result="miss")
+    return None
+
+
+def _write_cache(cache_file, transcript):
+    os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+    with open(cache_file, "w") as f:
+        f.write(transcript)
+
+
+def _segments_path(cache_file):
+    return cache_file[:-len(".txt")] + ".segments.json"
+
+
+def _read_segments(cache_file):
+    path = _segments_path(cache_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable segment cache %s: %s", path, e)
+        return None
+
+
+def _write_segments(cache_file, segments):
+    if segments:
+        with open(_segments_path(cache_file), "w") as f:
+            json.dump(segments, f)
+
+
+def _known_failure(result, notify):
+    """
+    Fills in the error of a result whose source failed recently and is still backing off.
+    Returns True if the source should be skipped.
+    """
+    from utils.negative_cache import get_failure
+    failure = get_failure(result["source_id"])
+    if failure is None:
+        return False
+    wait = int(failure["retry_at"] - time.time())
+    reason = failure["reason"].removeprefix("[ERROR]").strip()
+    result["error"] = f"[ERROR] Skipped after {failure['failures']} failed attempt(s), retry in {wait}s: {reason}"
+    notify("warning", f"{result['source']}: {result['error']}")
+    return True
+
+
+def _fail(result, error, notify, permanent=False):
+    """
+    Reports a failed source. Only permanent failures are negative-cached: a local or transient error
+    (Whisper not loaded, network errors, timeouts) would otherwise block healthy sources for every process.
+    """
+    from utils.negative_cache import record_failure
+    notify("warning", f"{result['source']}: {error}")
+    result["error"] = error
+    if permanent:
+        record_failure(result["source_id"], error)
+    return result
+
+
+def _succeed(result, cache_file, transcript, segments):
+    from utils.negative_cache import clear_failure
+    _write_cache(cache_file, transcript)
+    _write_segments(cache_file, segments)
+    clear_failure(result["source_id"])
+    result.update(transcript=transcript, segments=segments)
+    return result
+
+
+def ingest_audio(audio_path, notify=_log_notify):
+    """
+    Transcribes a local audio file with Whisper, using the transcript cache keyed by a hash of the file's
+    contents. Failures are local (model, file), so they are never negative-cached.
+    Returns a dict with source_id, transcript (None on failure), segments (timed, if known), cached and error.
+    """
+    from utils.youtube_utils import get_timed_transcript
+    from utils.source_keys import audio_key
+    hash_id = audio_key(audio_path)
+    cache_file = os.path.join(CACHE_DIR, f"{hash_id}.txt")
+    result = {"source": audio_path, "source_id": hash_id, "transcript": None, "segments": None,
+              "cached": False, "error": None}
+    transcript = _read_cache(cache_file)
+    if transcript is not None:
+        result.update(transcript=transcript, segments=_read_segments(cache_file), cached=True)
+        return result
+    notify("info", "Transcribing uploaded audio with Whisper...")
+    duration = get_audio_duration(audio_path)
+    if duration and duration > 600:
+        notify("warning", f"Uploaded audio is long ({int(duration//60)} min). Transcription may take a while.")
+    try:
+        transcript, segments = get_timed_transcript(None, audio_path)
+    except RuntimeError as e:
+        return _fail(result, str(e), notify)
+    if transcript and transcript.strip().startswith('[ERROR]'):
+        return _fail(result, transcript, notify)
+    return _succeed(result, cache_file, transcript, segments)
+
+
+def ingest_url(url, notify=_log_notify):
+    """
+    Fetches the transcript of a YouTube video (or generates it with Whisper), using the transcript cache.
+    Videos that recently failed permanently (no captions and the download refused, e.g. unavailable or private)
+    are skipped until their backoff expires, without any network requests.
+    Every URL form of a video (youtu.be, shorts, embed, &t=...) maps to the same video id and cache entry.
+    Returns a dict with source_id, transcript (None on failure), segments (timed, if known), cached and error.
+    """
+    from utils.youtube_utils import get_timed_transcript, is_permanent_failure
+    from utils.source_keys import parse_source
+    kind, video_id = parse_source(url)
+    if kind != "video":
+        error = f"[ERROR] Not a YouTube video URL: {url}"
+        notify("warning", error)
+        return {"source": url, "source_id": None, "transcript": None, "segments": None,
+                "cached": False, "error": error}
+    cache_file = os.path.join(CACHE_DIR, f"{video_id}.txt")
+    result = {"source": url, "source_id": video_id, "transcript": None, "segments": None,
+              "cached": False, "error": None}
+    transcript = _read_cache(cache_file)
+    if transcript is not None:
+        result.update(transcript=transcript, segments=_read_segments(cache_file), cached=True)
+    else:
+        if _known_failure(result, notify):
+            return result
+        notify("info", f"Processing {url}...")
+        try:
+            transcript, segments = get_timed_transcript(url)
+        except RuntimeError as e:
+            return _fail(result, str(e), notify)
+        # Handle Whisper/YouTube transcript errors
+        if transcript and transcript.strip().startswith('[ERROR]'):
+            return _fail(result, transcript, notify, permanent=is_permanent_failure(transcript.strip()))
+        _succeed(result, cache_file, transcript, segments)
+    # Try to warn if video is long (if audio file exists)
+    audio_path = os.path.join(TEMP_AUDIO_DIR, f"{video_id}.mp3")
+    duration = get_audio_duration(audio_path) if os.path.exists(audio_path) else None
+    if duration and duration > 900:
+        notify("warning", f"Video {url} is long ({int(duration//60)} min). Transcription may take a while.")
+    logging.info("Processed %s", url)
+    return result
+
+
+def ingest_source(source, notify=_log_notify, local_files=False):
+    """
+    Ingests one source, dispatching on whether it is a local audio file (only with local_files) or a YouTube URL.
+    """
+    if local_files and is_audio_path(source):
+        return ingest_audio(source, notify)
+    return ingest_url(source, notify)
+
+
+def _playlist_cache_path(kind, key):
+    return os.path.join(CACHE_DIR, f"{kind}_{re.sub(r'[^A-Za-z0-9_@-]', '_', key)}.playlist.json")
+
+
+def expand_playlist(kind, key, notify=_log_notify):
+    """
+    Returns the video ids of a playlist or channel. The list is cached for PLAYLIST_CACHE_SECONDS,
+    so re-submitting a playlist (e.g. to resume an interrupted ingest) does not list it again.
+    """
+    from utils.source_keys import canonical_url
+    from utils.youtube_utils import list_playlist_videos
+    path = _playlist_cache_path(kind, key)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < PLAYLIST_CACHE_SECONDS:
+        try:
+            with open(path, "r") as f:
+                return json.load(f)["videos"]
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning("Ignoring unreadable playlist cache %s: %s", path, e)
+    notify("info", f"Listing videos of {kind} {key}...")
+    videos = list_playlist_videos(canonical_url(kind, key))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"videos": videos}, f)
+    return videos
+
+
+def expand_sources(sources, notify=_log_notify, local_files=False):
+    """
+    Replaces playlist and channel URLs with the URLs of their videos and drops repeated references to
+    the same video, keeping the first occurrence. Audio paths are passed through with local_files and dropped
+    otherwise, since sources from the web UI or the API must not read files off the server; other sources
+    are passed through.
+    """
+    from utils.source_keys import parse_source, canonical_url
+    seen = set()
+    expanded = []
+
+    def add(source, key):
+        if key not in seen:
+            seen.add(key)
+            expanded.append(source)
+
+    for source in sources:
+        if local_files and is_audio_path(source):
+            add(source, source)
+            continue
+        if not local_files and _looks_like_local_file(source):
+            notify("warning", f"{source}: local files are only accepted from the command line; upload the audio instead.")
+            continue
+        kind, key = parse_source(source)
+        if kind in ("playlist", "channel"):
+            try:
+                videos = expand_playlist(kind, key, notify)
+            except RuntimeError as e:
+                notify("warning", f"{source}: {e}")
+                continue
+            notify("info", f"{source}: {len(videos)} videos.")
+            for video_id in videos:
+                add(canonical_url("video", video_id), video_id)
+        else:
+            add(source, key or source)
+    return expanded
+
+
+def ingest_sources(sources, max_workers=None, notify=_log_notify, local_files=False):
+    """
+    Ingests many sources and returns their results in input order. Playlist and channel URLs are expanded
+    into their videos, and repeated URLs of the same video are ingested once.
+    Up to max_workers sources (default INGEST_MAX_WORKERS) are fetched in parallel threads. notify is only
+    called from the calling thread, so it may use thread-bound APIs such as Streamlit's.
+    Every finished source is cached right away, so an interrupted run resumes where it stopped.
+    Local audio paths are only ingested with local_files, i.e. for trusted callers such as the CLI.
+    """
+    sources = expand_sources((s.strip() for s in sources if s and s.strip()), notify, local_files)
+    max_workers = INGEST_MAX_WORKERS if max_workers is None else max_workers
+    if max_workers <= 1 or len(sources) <= 1:
+        return [ingest_source(source, notify, local_files) for source in sources]
+    messages = queue.Queue()
+
+    def queued_notify(level, message):
+        messages.put((level, message))
+
+    def flush():
+        while not messages.empty():
+            notify(*messages.get_nowait())
+
+    results = [None] * len(sources)
+    done = cached = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Each worker runs in a copy of the caller's context, so its logs and spans keep the caller's ids
+        futures = {pool.submit(contextvars.copy_context().run, ingest_source, source, queued_notify, local_files): i
+                   for i, source in enumerate(sources)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            done += 1
+            cached += result["cached"]
+            flush()
+            logging.info("Ingested %s/%s sources (%s from cache).", done, len(sources), cached)
+    flush()
+    return results
+
+
+def chunk_result(result):
+    """
+    Chunks one ingest result. Timed transcripts are chunked over their segments (by token budget, or by
+    fixed time windows when CHUNKING_MODE is "time"), so every chunk knows its time range.
+    With CHUNKING_MODE "semantic" boundaries follow topic shifts and each chunk comes with its embedding.
+    Yields (text, start, end, embedding); start and end are None when the transcript has no timing,
+    embedding is None when the chunk still has to be encoded.
+    """
+    from utils.text_processing import iter_chunks_tokens, chunk_segments, chunk_time_windows, chunk_semantic
+    segments = result.get("segments")
+    if CHUNKING_MODE == "semantic":
+        chunks = chunk_semantic(segments=segments) if segments else chunk_semantic(result["transcript"])
+        for chunk in chunks:
+            yield chunk["text"], chunk["start"], chunk["end"], chunk["embedding"]
+    elif segments:
+        chunker = chunk_time_windows if CHUNKING_MODE == "time" else chunk_segments
+        for chunk in chunker(segments):
+            yield chunk["text"], chunk["start"], chunk["end"], None
+    else:
+        for text in iter_chunks_tokens(result["transcript"]):
+            yield text, None, None, None
+
+
+def iter_chunk_records(results):
+    """
+    Lazily chunks the transcripts of successful ingest results, yielding (chunk, source_id, start, end, embedding)
+    records where source_id is the video id or audio hash the chunk came from.
+    """
+    for result in results:
+        if not result["transcript"]:
+            continue
+        for text, start, end, embedding in chunk_result(result):
+            yield text, result["source_id"], start, end, embedding
+
+
+def sources_fingerprint(results):
+    """
+    Identifies the index that build_index would produce for these results, without chunking them.
+    """
+    from config import (EMBEDDING_MODEL_NAME, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS,
+                        CHUNK_WINDOW_SECONDS, CHUNK_WINDOW_OVERLAP_SECONDS,
+                        SEMANTIC_WINDOW_WORDS, SEMANTIC_BREAK_PERCENTILE, FAISS_INDEX)
+    settings = [EMBEDDING_MODEL_NAME, FAISS_INDEX, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNKING_MODE,
+                CHUNK_WINDOW_SECONDS, CHUNK_WINDOW_OVERLAP_SECONDS,
+                SEMANTIC_WINDOW_WORDS, SEMANTIC_BREAK_PERCENTILE, DEDUP_CHUNKS and DEDUP_THRESHOLD]
+    digest = hashlib.sha1("\0".join(str(v) for v in settings).encode())
+    for result in results:
+        if result["transcript"]:
+            digest.update(f"\0{result['source_id']}\0{bool(result.get('segments'))}\0".encode())
+            digest.update(result["transcript"].encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_index(results):
+    """
+    Chunks the ingested transcripts and streams the chunks into store_embeddings, so encoding starts
+    while later transcripts are still being chunked. Reuses the stored index if it was built from
+    the same transcripts. Near-duplicate chunks (across all sources) are dropped before embedding when
+    DEDUP_CHUNKS is set. Returns {"chunks": number of chunks, "sources": source ids indexed}; sources whose
+    chunks were all dropped as duplicates of another source's are not in the index and not listed.
+    """
+    from utils.embedding_utils import store_embeddings, load_store
+    sources = [r["source_id"] for r in results if r["transcript"]]
+    if not sources:
+        return {"chunks": 0, "sources": []}
+    records = iter_chunk_records(results)
+    if DEDUP_CHUNKS:
+        from utils.dedup_utils import iter_unique_records
+        records = iter_unique_records(records)
+    stored = store_embeddings(records, fingerprint=sources_fingerprint(results))
+    store = load_store() if stored else None
+    indexed = set(store["source_names"]) if store else set()
+    return {"chunks": stored or 0, "sources": [source for source in sources if source in indexed]}
+
+
+def warm_models():
+    """
+    Loads the embedding, reranker and Whisper models so the first request does not pay for it.
+    Returns a dict of model name to whether it loaded.
+    """
+    from utils.embedding_utils import get_embedding_model
+    from utils.whisper_utils import get_whisper_model
+    from utils.rerank_utils import get_reranker
+    return {
+        "embedding": get_embedding_model() is not None,
+        "reranker": get_reranker() is not None,
+        "whisper": get_whisper_model() is not None,
+    }
+
+
+def warm_up():
+    """
+    Loads the models and runs each once on dummy input (an embedding batch, a cross-encoder pair, one second
+    of silence through Whisper and a FAISS search), so buffers are allocated before the first real request.
+    Returns a dict of stage to {"ok": bool, "seconds": float}.
+    """
+    import numpy as np
+    from utils.embedding_utils import get_embedding_model, load_vectorstore, VECTORSTORE_PATH
+    from utils.whisper_utils import get_whisper_model, _transcribe_lock
+    from utils.rerank_utils import get_reranker
+
+    def embedding():
+        model = get_embedding_model()
+        return model is not None and model.encode(["warm-up sentence"] * 8, batch_size=8) is not None
+
+    def reranker():
+        model = get_reranker()
+        return model is not None and model.predict([("warm-up question", "warm-up passage")]) is not None
+
+    def whisper():
+        model = get_whisper_model()
+        if model is None:
+            return False
+        with _transcribe_lock:
+            model.transcribe(np.zeros(16000, dtype=np.float32))
+        return True
+
+    def faiss_search():
+        import faiss
+        index, _ = load_vectorstore() if os.path.exists(VECTORSTORE_PATH) else (None, None)
+        if index is None:
+            model = get_embedding_model()
+            index = faiss.IndexFlatL2(model.get_sentence_embedding_dimension() if model is not None else 768)
+            index.add(np.zeros((1, index.d), dtype=np.float32))
+        index.search(np.zeros((1, index.d), dtype=np.float32), 1)
+        return True
+
+    status = {}
+    for name, stage in (("embedding", embedding), ("reranker", reranker), ("whisper", whisper), ("faiss", faiss_search)):
+        start = time.perf_counter()
+        try:
+            ok = bool(stage())
+        except Exception as e:
+            logging.warning("Warm-up of %s failed: %s", name, e)
+            ok = False
+        status[name] = {"ok": ok, "seconds": round(time.perf_counter() - start, 3)}
+    logging.info("Warm-up finished: %s", status)
+    return status
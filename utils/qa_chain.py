@@ -1,52 +1,290 @@
 import os
+import contextvars
 import requests
-from utils.embedding_utils import load_vectorstore
+from utils.embedding_utils import load_store, get_embedding_model
+from utils.bm25_utils import reciprocal_rank_fusion
+from utils.rerank_utils import rerank
+from utils.dedup_utils import LSHIndex, minhash
+from utils.source_keys import is_video_id, canonical_url
+from utils.tracing import span, collect_latencies
+from utils.metrics import Counter
+from config import RETRIEVAL_FETCH_K, CONTEXT_MAX_CHARS, LLM_MAX_CONCURRENCY, DEDUP_CHUNKS, HF_API_URL
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import logging
 
-def ask_question(question, top_k=5, hf_model="HuggingFaceH4/zephyr-7b-beta"):
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls by reason", ["reason"])
+
+DEFAULT_HF_MODEL = "HuggingFaceH4/zephyr-7b-beta"
+
+def select_context(question, ids, chunks, top_k, max_chars=CONTEXT_MAX_CHARS):
+    """
+    Reranks candidate chunk ids with the cross-encoder and keeps the best top_k whose text fits in max_chars.
+    Falls back to the retrieval order if the reranker is unavailable. Always keeps at least one chunk.
+    Chunks with identical text are only included once, and with DEDUP_CHUNKS near-duplicates of an already
+    selected chunk are skipped too, so copies of one passage cannot fill all top_k slots.
+    Returns (chunk id, rerank score) pairs, best first; the score is None without the reranker.
+    """
+    candidates = [chunks[i] for i in ids]
+    ranked = rerank(question, candidates)
+    if ranked is None:
+        ranked = [(pos, None) for pos in range(len(candidates))]
+    selected = []
+    seen = set()
+    lsh = LSHIndex() if DEDUP_CHUNKS else None
+    used = 0
+    for pos, score in ranked:
+        if len(selected) >= top_k:
+            break
+        chunk = candidates[pos]
+        if chunk in seen or (selected and used + len(chunk) > max_chars):
+            continue
+        if lsh is not None:
+            signature = minhash(chunk)
+            if lsh.query(signature) is not None:
+                continue
+            lsh.add(signature)
+        selected.append((ids[pos], None if score is None else float(score)))
+        seen.add(chunk)
+        used += len(chunk)
+    return selected
+
+def source_url(source_id, start=None):
+    """
+    Returns a link to a YouTube video, starting at `start` seconds if given, or None for non-YouTube sources.
+    """
+    if not is_video_id(source_id):
+        return None
+    url = canonical_url("video", source_id)
+    if start is not None:
+        url += f"&t={int(start)}s"
+    return url
+
+def describe_sources(ids, scores=None, store=None):
+    """
+    Returns source details for chunk ids: chunk_id, source_id, start and end (seconds, or None), a url
+    that jumps to the chunk's position in the video, and the chunk's rerank score from scores (or None).
+    store is the load_store() snapshot the ids come from (by default the current one).
+    """
+    store = store or load_store()
+    meta, source_names = (store["meta"], store["source_names"]) if store else (None, None)
+    scores = scores or {}
+    described = []
+    for chunk_id in ids:
+        if meta is None or chunk_id >= len(meta):
+            described.append({"chunk_id": chunk_id, "source_id": None, "start": None, "end": None, "url": None,
+                              "score": scores.get(chunk_id)})
+            continue
+        row = meta[chunk_id]
+        source_id = source_names[row["source"]] or None
+        start = None if np.isnan(row["start"]) else float(row["start"])
+        end = None if np.isnan(row["end"]) else float(row["end"])
+        described.append({"chunk_id": chunk_id, "source_id": source_id, "start": start, "end": end,
+                          "url": source_url(source_id, start), "score": scores.get(chunk_id)})
+    return described
+
+def format_sources(sources):
+    """
+    Formats source details as Markdown links with mm:ss timestamps, one per line.
+    """
+    lines = []
+    for source in sources:
+        if source["url"] is None:
+            continue
+        label = source["source_id"]
+        if source["start"] is not None:
+            minutes, seconds = divmod(int(source["start"]), 60)
+            label += f" @ {minutes}:{seconds:02d}"
+        lines.append(f"- [{label}]({source['url']})")
+    return "\n".join(dict.fromkeys(lines))
+
+def unknown_sources(sources, store=None):
+    """
+    Returns the ids in sources that the stored index (by default the current one) has no chunks for.
+    """
+    store = store or load_store()
+    known = set(store["source_names"]) if store else set()
+    return [source for source in sources if source not in known]
+
+def candidate_ids(question, dense_ids, chunks, bm25, fetch_k, allowed=None):
+    """
+    Fuses the dense FAISS ids with BM25 keyword hits (reciprocal-rank fusion) and returns up to fetch_k chunk ids.
+    If allowed is given, only chunk ids in that set are kept.
+    """
+    if bm25 is not None:
+        with span("bm25_search", k=fetch_k):
+            sparse_ids = [doc_id for doc_id, _ in bm25.search(question, fetch_k) if doc_id < len(chunks)]
+        ids = reciprocal_rank_fusion([dense_ids, sparse_ids])
+    else:
+        ids = dense_ids
+    if allowed is not None:
+        ids = [i for i in ids if i in allowed]
+    return ids[:fetch_k]
+
+def build_prompt(question, context_chunks):
+    context = "\n\n".join(context_chunks)
+    return (
+        "You are a helpful assistant. Use the following context to answer the user's question as accurately as possible.\n\n"
+        f"Context:\n{context}\n\n"
+        f"Question: {question}\nAnswer:"
+    )
+
+def call_llm(prompt, hf_model=DEFAULT_HF_MODEL):
+    """
+    Sends a prompt to the Hugging Face Inference API (or a compatible endpoint at HF_API_URL) and returns the generated answer,
+    or an [ERROR] string if the token is missing or the API call fails.
+    """
+    hf_token = os.environ.get("HF_TOKEN")
+    if not hf_token:
+        LLM_ERRORS.inc(reason="no_token")
+        return "[ERROR] Hugging Face API token (HF_TOKEN) not set."
+    api_url = HF_API_URL.format(model=hf_model)
+    headers = {"Authorization": f"Bearer {hf_token}"}
+    payload = {"inputs": prompt, "parameters": {"max_new_tokens": 256, "temperature": 0.2}}
+    with span("llm_call", model=hf_model, prompt_chars=len(prompt)) as s:
+        try:
+            response = requests.post(api_url, headers=headers, json=payload, timeout=60)
+        except requests.RequestException as e:
+            LLM_ERRORS.inc(reason=type(e).__name__)
+            raise
+        s["status_code"] = response.status_code
+    if response.status_code != 200:
+        LLM_ERRORS.inc(reason=f"http_{response.status_code}")
+        logging.error("HF API error: %s %s", response.status_code, response.text)
+        return f"[ERROR] Hugging Face API error: {response.status_code}"
+    result = response.json()
+    # The output format may vary by model; handle both 'generated_text' and list of dicts
+    if isinstance(result, list) and 'generated_text' in result[0]:
+        answer = result[0]['generated_text'].strip()
+    elif isinstance(result, dict) and 'generated_text' in result:
+        answer = result['generated_text'].strip()
+    elif isinstance(result, list) and 'text' in result[0]:
+        answer = result[0]['text'].strip()
+    else:
+        answer = str(result)
+    # Optionally, remove the prompt from the answer if model echoes it
+    if answer.startswith(prompt):
+        answer = answer[len(prompt):].strip()
+    return answer
+
+def _safe_call_llm(prompt, hf_model):
+    try:
+        return call_llm(prompt, hf_model)
+    except Exception as e:
+        logging.error("LLM QA failed: %s", e)
+        return f"[ERROR] LLM QA failed: {e}"
+
+def _timed_call_llm(prompt, hf_model):
+    with collect_latencies() as latency_ms:
+        answer = _safe_call_llm(prompt, hf_model)
+    return answer, latency_ms
+
+def ask_question(question, top_k=5, hf_model=DEFAULT_HF_MODEL, fetch_k=RETRIEVAL_FETCH_K, return_sources=False,
+                 store=None):
     """
     Answers a question using the most relevant chunks from the vectorstore, via Hugging Face Inference API LLM.
-    Returns a string answer or an error message if data/model is missing.
+    Over-fetches fetch_k candidates from FAISS and BM25, fuses them with reciprocal-rank fusion,
+    and reranks them so only the best top_k reach the prompt.
+    Returns a string answer or an error message if data/model is missing. With return_sources=True, returns
+    (answer, sources) where sources describes the chunks used, with timestamped links and rerank scores
+    (see describe_sources). Wrap the call in tracing.collect_latencies() for its per-stage latencies.
+    store is the load_store() snapshot to answer from (by default the current one).
+    """
+    with span("ask_question", top_k=top_k) as s:
+        # One snapshot for the FAISS index, chunks, BM25 and metadata, so a concurrent rebuild cannot mix versions
+        store = store or load_store()
+        if store is None:
+            logging.warning("No vectorstore or chunks available for QA.")
+            answer, selected = "No data to answer the question.", {}
+        else:
+            index, chunks = store["index"], store["chunks"]
+            try:
+                with span("embed_query"):
+                    q_emb = get_embedding_model().encode([question])
+                fetch_k = max(fetch_k, top_k)
+                with span("faiss_search", k=min(fetch_k, index.ntotal), ntotal=index.ntotal):
+                    D, I = index.search(np.array(q_emb), min(fetch_k, index.ntotal))
+                dense_ids = [int(i) for i in I[0] if i != -1]
+                ids = candidate_ids(question, dense_ids, chunks, store["bm25"], fetch_k)
+                selected = dict(select_context(question, ids, chunks, top_k))
+                answer = call_llm(build_prompt(question, [chunks[i] for i in selected]), hf_model)
+            except Exception as e:
+                logging.error("LLM QA failed: %s", e)
+                answer, selected = f"[ERROR] LLM QA failed: {e}", {}
+        s.update(chunks=len(selected), answer_chars=len(answer))
+    if return_sources:
+        return answer, describe_sources(list(selected), selected, store)
+    return answer
+
+def ask_questions(questions, sources=None, top_k=5, hf_model=DEFAULT_HF_MODEL, fetch_k=RETRIEVAL_FETCH_K,
+                  max_workers=LLM_MAX_CONCURRENCY, store=None):
+    """
+    Answers many questions over the current vectorstore in one pass.
+    All questions are embedded in one batch and searched with a single FAISS call. Duplicate questions and
+    identical prompts are sent to the LLM only once, and LLM calls run with at most max_workers in flight.
+    If sources is given (source ids as passed to store_embeddings), retrieval is restricted to those sources
+    (an empty list, like None, means no restriction);
+    if any of them is not in the index, every question gets an [ERROR] answer instead of an ungrounded one.
+    Yields {"question", "answer", "sources", "latency_ms"} dicts in input order, each as soon as it and all
+    earlier ones are ready; sources describes the chunks used, as in ask_question. latency_ms holds per-stage
+    milliseconds; embed_query and faiss_search run once for the whole batch and report that batch's time.
+    store is the load_store() snapshot to answer from (by default the current one).
     """
-    index, chunks = load_vectorstore()
-    if index is None or chunks is None:
+    questions = [q.strip() for q in questions if q and q.strip()]
+    if not questions:
+        return
+    store = store or load_store()
+    if store is None:
         logging.warning("No vectorstore or chunks available for QA.")
-        return "No data to answer the question."
+        for question in questions:
+            yield {"question": question, "answer": "No data to answer the question.", "sources": [], "latency_ms": {}}
+        return
+    index, chunks, bm25 = store["index"], store["chunks"], store["bm25"]
+    allowed = None
+    if sources:
+        missing = unknown_sources(sources, store)
+        if bm25 is not None:
+            allowed = {doc_id for source in sources for doc_id in bm25.sources.get(source, [])}
+        if missing or allowed == set():
+            error = (f"[ERROR] Sources not in the index: {', '.join(missing)}" if missing
+                     else "[ERROR] No indexed chunks for the requested sources.")
+            logging.warning(error)
+            for question in questions:
+                yield {"question": question, "answer": error, "sources": [], "latency_ms": {}}
+            return
+    fetch_k = max(fetch_k, top_k)
+    # Restricting to a subset of sources drops hits, so search deeper to keep enough candidates
+    search_k = min(fetch_k if allowed is None else fetch_k * 4, index.ntotal)
+    unique_questions = list(dict.fromkeys(questions))
     try:
-        from utils.embedding_utils import embedding_model
-        q_emb = embedding_model.encode([question])
-        D, I = index.search(np.array(q_emb), top_k)
-        context = "\n\n".join([chunks[i] for i in I[0]])
-        prompt = (
-            "You are a helpful assistant. Use the following context to answer the user's question as accurately as possible.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {question}\nAnswer:"
-        )
-        hf_token = os.environ.get("HF_TOKEN")
-        if not hf_token:
-            return "[ERROR] Hugging Face API token (HF_TOKEN) not set."
-        api_url = f"https://api-inference.huggingface.co/models/{hf_model}"
-        headers = {"Authorization": f"Bearer {hf_token}"}
-        payload = {"inputs": prompt, "parameters": {"max_new_tokens": 256, "temperature": 0.2}}
-        response = requests.post(api_url, headers=headers, json=payload, timeout=60)
-        if response.status_code != 200:
-            logging.error(f"HF API error: {response.status_code} {response.text}")
-            return f"[ERROR] Hugging Face API error: {response.status_code}"
-        result = response.json()
-        # The output format may vary by model; handle both 'generated_text' and list of dicts
-        if isinstance(result, list) and 'generated_text' in result[0]:
-            answer = result[0]['generated_text'].strip()
-        elif isinstance(result, dict) and 'generated_text' in result:
-            answer = result['generated_text'].strip()
-        elif isinstance(result, list) and 'text' in result[0]:
-            answer = result[0]['text'].strip()
-        else:
-            answer = str(result)
-        # Optionally, remove the prompt from the answer if model echoes it
-        if answer.startswith(prompt):
-            answer = answer[len(prompt):].strip()
-        return answer
+        with collect_latencies() as batch_latency_ms:
+            with span("embed_query", queries=len(unique_questions)):
+                q_embs = get_embedding_model().encode(unique_questions, batch_size=64)
+            with span("faiss_search", queries=len(unique_questions), k=search_k, ntotal=index.ntotal):
+                D, I = index.search(np.asarray(q_embs, dtype=np.float32), search_k)
     except Exception as e:
-        logging.error(f"LLM QA failed: {e}")
-        return f"[ERROR] LLM QA failed: {e}"
+        logging.error("Batch retrieval failed: %s", e)
+        for question in questions:
+            yield {"question": question, "answer": f"[ERROR] LLM QA failed: {e}", "sources": [], "latency_ms": {}}
+        return
+    logging.info("Retrieved context for %s unique questions (%s submitted).", len(unique_questions), len(questions))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures_by_prompt = {}
+        futures_by_question = {}
+        sources_by_question = {}
+        latency_by_question = {}
+        for question, row in zip(unique_questions, I):
+            with collect_latencies() as latency_ms:
+                dense_ids = [int(i) for i in row if i != -1]
+                ids = candidate_ids(question, dense_ids, chunks, bm25, fetch_k, allowed)
+                selected = dict(select_context(question, ids, chunks, top_k))
+            prompt = build_prompt(question, [chunks[i] for i in selected])
+            if prompt not in futures_by_prompt:
+                futures_by_prompt[prompt] = pool.submit(contextvars.copy_context().run, _timed_call_llm, prompt, hf_model)
+            futures_by_question[question] = futures_by_prompt[prompt]
+            sources_by_question[question] = describe_sources(list(selected), selected, store)
+            latency_by_question[question] = {**batch_latency_ms, **latency_ms}
+        for question in questions:
+            answer, llm_latency_ms = futures_by_question[question].result()
+            yield {"question": question, "answer": answer, "sources": sources_by_question[question],
+                   "latency_ms": {**latency_by_question[question], **llm_latency_ms}}
@@ -0,0 +1,69 @@
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from config import RERANK_MODEL_NAME, RERANK_BATCH_SIZE
+from utils.tracing import span
+from utils.metrics import Counter, record_model_memory
+
+# Scores are cached per (question, chunk) pair so re-asked questions skip the cross-encoder
+SCORE_CACHE_SIZE = 4096
+_score_cache = OrderedDict()
+# rerank runs concurrently on the API server's query pool and the job workers
+_score_cache_lock = threading.Lock()
+SCORE_CACHE = Counter("rerank_score_cache_requests_total", "Cross-encoder score cache lookups by result", ["result"])
+
+
+@lru_cache(maxsize=1)
+def get_reranker():
+    """
+    Loads the cross-encoder once per process on CPU. Returns None if the model cannot be loaded.
+    """
+    try:
+        from sentence_transformers import CrossEncoder
+        model = CrossEncoder(RERANK_MODEL_NAME, device="cpu", max_length=512)
+        record_model_memory("reranker", model)
+        return model
+    except Exception as e:
+        logging.error("Failed to load reranker model: %s", e)
+        return None
+
+
+def rerank(question, passages, batch_size=RERANK_BATCH_SIZE):
+    """
+    Scores passages against the question with the cross-encoder in batches.
+    Returns a list of (position, score) sorted by descending score, or None if the reranker is unavailable.
+    """
+    model = get_reranker()
+    if model is None or not passages:
+        return None
+    with span("rerank", passages=len(passages)) as s:
+        scores = [None] * len(passages)
+        pending = []
+        with _score_cache_lock:
+            for pos, passage in enumerate(passages):
+                cached = _score_cache.get((question, passage))
+                if cached is None:
+                    pending.append(pos)
+                else:
+                    _score_cache.move_to_end((question, passage))
+                    scores[pos] = cached
+        s.update(scored=len(pending), cached=len(passages) - len(pending))
+        SCORE_CACHE.inc(len(passages) - len(pending), result="hit")
+        SCORE_CACHE.inc(len(pending), result="miss")
+        try:
+            if pending:
+                pairs = [(question, passages[pos]) for pos in pending]
+                predicted = model.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+                for pos, score in zip(pending, predicted):
+                    scores[pos] = float(score)
+                with _score_cache_lock:
+                    for pos in pending:
+                        _score_cache[(question, passages[pos])] = scores[pos]
+                    while len(_score_cache) > SCORE_CACHE_SIZE:
+                        _score_cache.popitem(last=False)
+        except Exception as e:
+            logging.error("Reranking failed: %s", e)
+            return None
+    return sorted(enumerate(scores), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,94 @@
+"""
+Canonical keys for ingest sources, so equivalent inputs share one cache entry, index entry and signature store.
+
+    https://www.youtube.com/watch?v=ID&t=555s, https://youtu.be/ID?si=..., https://youtube.com/shorts/ID,
+    https://www.youtube-nocookie.com/embed/ID, https://m.youtube.com/live/ID, ID      -> ("video", ID)
+    https://www.youtube.com/playlist?list=PL..., watch?v=ID&list=PL... (list only)    -> ("playlist", PL...)
+    https://www.youtube.com/channel/UC..., /@handle, /c/name, /user/name              -> ("channel", ...)
+
+Local audio files are keyed by a hash of their contents rather than their path.
+"""
+import re
+import hashlib
+from urllib.parse import urlsplit, parse_qs
+
+VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+PLAYLIST_ID = re.compile(r"^(?:PL|UU|LL|FL|OL|RD)[A-Za-z0-9_-]+$")
+YOUTUBE_HOSTS = ("youtube.com", "youtube-nocookie.com", "youtu.be")
+# Path prefixes followed by the video id
+VIDEO_PATHS = ("shorts", "embed", "live", "v", "e")
+CHANNEL_PATHS = ("channel", "c", "user")
+
+def _is_youtube_host(host):
+    host = host.lower().split(":")[0]
+    return any(host == h or host.endswith("." + h) for h in YOUTUBE_HOSTS)
+
+def parse_source(source):
+    """
+    Parses a YouTube URL or bare video id. Returns (kind, key) with kind "video", "playlist" or "channel",
+    or (None, None) if the source is not a recognizable YouTube reference.
+    A watch URL with both a video and a list parameter refers to the video.
+    """
+    source = source.strip()
+    if VIDEO_ID.match(source):
+        return "video", source
+    if "://" not in source:
+        source = "https://" + source
+    parts = urlsplit(source)
+    if not _is_youtube_host(parts.netloc):
+        return None, None
+    query = parse_qs(parts.query)
+    segments = [s for s in parts.path.split("/") if s]
+
+    if parts.netloc.lower().split(":")[0].endswith("youtu.be"):
+        if segments and VIDEO_ID.match(segments[0]):
+            return "video", segments[0]
+        return None, None
+    video = query.get("v", [""])[0]
+    if VIDEO_ID.match(video):
+        return "video", video
+    if len(segments) >= 2 and segments[0] in VIDEO_PATHS and VIDEO_ID.match(segments[1]):
+        return "video", segments[1]
+    playlist = query.get("list", [""])[0]
+    if PLAYLIST_ID.match(playlist):
+        return "playlist", playlist
+    if segments and segments[0].startswith("@"):
+        return "channel", segments[0]
+    if len(segments) >= 2 and segments[0] in CHANNEL_PATHS:
+        return "channel", segments[1] if segments[0] == "channel" else f"{segments[0]}/{segments[1]}"
+    return None, None
+
+def video_id(source):
+    """
+    Returns the 11-character video id of a YouTube URL or bare id, or None.
+    """
+    kind, key = parse_source(source)
+    return key if kind == "video" else None
+
+def is_video_id(key):
+    return bool(key) and bool(VIDEO_ID.match(key))
+
+def canonical_url(kind, key):
+    """
+    Returns the canonical URL for a parsed (kind, key) pair.
+    """
+    if kind == "video":
+        return f"https://www.youtube.com/watch?v={key}"
+    if kind == "playlist":
+        return f"https://www.youtube.com/playlist?list={key}"
+    if kind == "channel":
+        if key.startswith("@") or "/" in key:
+            return f"https://www.youtube.com/{key}/videos"
+        return f"https://www.youtube.com/channel/{key}/videos"
+    raise ValueError(f"Unknown source kind: {kind}")
+
+def audio_key(path, block_size=1 << 20):
+    """
+    Returns a key for a local audio file from a hash of its contents, so the same recording uploaded
+    under different names (or different recordings under the same name) are told apart correctly.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -1,32 +1,334 @@
 import re
+import logging
+from functools import lru_cache
+import numpy as np
+from utils.tracing import span, traced
+from config import (CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_WINDOW_SECONDS, CHUNK_WINDOW_OVERLAP_SECONDS,
+                    SEMANTIC_WINDOW_WORDS, SEMANTIC_BREAK_PERCENTILE)
 
+SENTENCE_END = re.compile(r'[.!?](?= |$)')
+
+WORD = re.compile(r'\S+')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?]) +')
+
+@lru_cache(maxsize=8)
+def _piece_pattern(max_length):
+    # Matches a run of up to max_length words, so long sentences are cut by the regex engine
+    return re.compile(r'\S+(?:\s+\S+){0,%d}' % (max_length - 1))
+
+def _iter_sentence_spans(text):
+    pos = 0
+    for m in SENTENCE_BREAK.finditer(text):
+        yield pos, m.start()
+        pos = m.end()
+    yield pos, len(text)
+
+def iter_chunk_spans(text, max_length=2000):
+    """
+    Scans text once and yields (start, end) character offsets of chunks of up to max_length words,
+    splitting at sentence boundaries (., ! or ? followed by a space) where possible.
+    A sentence longer than max_length is cut every max_length words.
+    Only the words of the sentence being placed are ever counted; no sentence or word lists are built.
+    """
+    piece = _piece_pattern(max_length)
+    chunk_start = chunk_end = None
+    chunk_len = 0
+    for sent_start, sent_end in _iter_sentence_spans(text):
+        if sent_end - sent_start < 2 * max_length:
+            # Too short to hold more than max_length words: no need to look for cut points
+            sentence = text[sent_start:sent_end]
+            stripped = sentence.strip()
+            if not stripped:
+                continue
+            start = sent_start + len(sentence) - len(sentence.lstrip())
+            end = start + len(stripped)
+            words = len(stripped.split())
+        else:
+            pieces = piece.finditer(text, sent_start, sent_end)
+            m = next(pieces, None)
+            if m is None:
+                continue
+            following = next(pieces, None)
+            if following is not None:
+                # The sentence cannot fit in any chunk: flush the pending chunk, then emit full pieces
+                if chunk_len:
+                    yield chunk_start, chunk_end
+                    chunk_len = 0
+                while following is not None:
+                    yield m.span()
+                    m, following = following, next(pieces, None)
+            start, end = m.span()
+            words = len(WORD.findall(text, start, end))
+        if not chunk_len:
+            chunk_start, chunk_end, chunk_len = start, end, words
+        elif chunk_len + words <= max_length:
+            chunk_end = end
+            chunk_len += words
+        else:
+            yield chunk_start, chunk_end
+            chunk_start, chunk_end, chunk_len = start, end, words
+    if chunk_len:
+        yield chunk_start, chunk_end
+
+def iter_chunks(text, max_length=2000):
+    """
+    Yields chunks of up to max_length words as slices of the original text, so consumers such as
+    store_embeddings can start on the first chunk before the rest of the text is scanned.
+    """
+    for start, end in iter_chunk_spans(text, max_length):
+        yield text[start:end]
+
+@traced("chunk_text", sizes=lambda chunks: {"chunks": len(chunks)})
 def chunk_text(text, max_length=2000):
     """
     Splits text into chunks of up to max_length words, trying to split at sentence boundaries.
     Handles edge cases where a sentence is longer than max_length by splitting it further.
-    Returns a list of non-empty, stripped chunks.
+    Returns a list of non-empty chunks, each a slice of the original text.
+    """
+    return list(iter_chunks(text, max_length))
+
+def default_tokenizer():
+    """
+    Returns (tokenizer, max_tokens) for the embedding model, or (None, None) if the model is not loaded.
+    max_tokens is the model's input window minus the two special tokens it adds.
+    """
+    from utils.embedding_utils import get_embedding_model
+    embedding_model = get_embedding_model()
+    if embedding_model is None:
+        return None, None
+    return embedding_model.tokenizer, embedding_model.max_seq_length - 2
+
+def _resolve(tokenizer, max_tokens):
+    if tokenizer is None:
+        tokenizer, window = default_tokenizer()
+    else:
+        model_max = getattr(tokenizer, "model_max_length", None)
+        # Tokenizers without a configured limit report a huge sentinel value
+        window = model_max - 2 if model_max and model_max < 100000 else None
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS or window or 256
+    if window:
+        max_tokens = min(max_tokens, window)
+    return tokenizer, max_tokens
+
+@traced("chunk_text_tokens", sizes=lambda chunks: {"chunks": len(chunks)})
+def chunk_text_tokens(text, max_tokens=None, overlap_tokens=CHUNK_OVERLAP_TOKENS, tokenizer=None):
+    """
+    Splits text into chunks of at most max_tokens tokens as measured by the embedding tokenizer,
+    so no part of a chunk is truncated away by the encoder. Consecutive chunks share overlap_tokens tokens.
+    Cuts are placed at the last sentence end in the second half of a window when there is one.
+    Chunks are slices of the original text. Without a tokenizer, falls back to word-based chunk_text.
+    """
+    return list(iter_chunks_tokens(text, max_tokens, overlap_tokens, tokenizer))
+
+def iter_chunks_tokens(text, max_tokens=None, overlap_tokens=CHUNK_OVERLAP_TOKENS, tokenizer=None):
     """
-    sentences = re.split(r'(?<=[.!?]) +', text)
+    Generator version of chunk_text_tokens: tokenizes once, then yields each chunk as soon as its cut is known.
+    """
+    tokenizer, max_tokens = _resolve(tokenizer, max_tokens)
+    if tokenizer is None:
+        logging.warning("Embedding tokenizer unavailable, falling back to word-based chunking.")
+        yield from iter_chunks(text, max_length=max(1, int(max_tokens * 0.75)))
+        return
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    with span("tokenize", chars=len(text)) as s:
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        offsets = encoding["offset_mapping"]
+        num_tokens = len(offsets)
+        # Token index just after each sentence end, for snapping cuts to sentence boundaries
+        sentence_ends = set()
+        ends = iter(m.end() for m in SENTENCE_END.finditer(text))
+        next_end = next(ends, None)
+        for i, (_, char_end) in enumerate(offsets):
+            while next_end is not None and next_end <= char_end:
+                sentence_ends.add(i + 1)
+                next_end = next(ends, None)
+        s["tokens"] = num_tokens
+    if num_tokens == 0:
+        return
+    start = 0
+    while start < num_tokens:
+        end = min(start + max_tokens, num_tokens)
+        if end < num_tokens:
+            for cut in range(end, start + max_tokens // 2, -1):
+                if cut in sentence_ends:
+                    end = cut
+                    break
+        chunk = text[offsets[start][0]:offsets[end - 1][1]].strip()
+        if chunk:
+            yield chunk
+        if end >= num_tokens:
+            break
+        start = max(end - overlap_tokens, start + 1)
+
+@traced("chunk_segments", sizes=lambda chunks: {"chunks": len(chunks)})
+def chunk_segments(segments, max_tokens=None, overlap_tokens=CHUNK_OVERLAP_TOKENS, tokenizer=None):
+    """
+    Packs timed transcript segments (dicts with 'text', 'start' and optional 'duration') into chunks
+    of at most max_tokens tokens without splitting a segment, so every chunk maps to a time range.
+    Consecutive chunks repeat trailing segments worth up to overlap_tokens tokens.
+    Segments longer than max_tokens are split with chunk_text_tokens and keep the segment's time range.
+    Returns a list of dicts with 'text', 'start' and 'end'.
+    """
+    tokenizer, max_tokens = _resolve(tokenizer, max_tokens)
+    texts = [seg["text"].strip() for seg in segments]
+    if tokenizer is not None:
+        lengths = [len(ids) for ids in tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]] if texts else []
+    else:
+        lengths = [int(len(t.split()) / 0.75) + 1 for t in texts]
     chunks = []
-    current_chunk = []
-    current_len = 0
-    for sentence in sentences:
-        words = sentence.split()
-        if not words:
+    window = []
+    window_tokens = 0
+
+    def flush():
+        first, last = segments[window[0]], segments[window[-1]]
+        chunks.append({
+            "text": " ".join(texts[i] for i in window),
+            "start": float(first["start"]),
+            "end": float(last["start"]) + float(last.get("duration", 0.0)),
+        })
+
+    for i, seg in enumerate(segments):
+        if not texts[i]:
             continue
-        if current_len + len(words) <= max_length:
-            current_chunk.extend(words)
-            current_len += len(words)
-        else:
-            if current_chunk:
-                chunks.append(' '.join(current_chunk).strip())
-            # If the sentence itself is longer than max_length, split it
-            while len(words) > max_length:
-                chunks.append(' '.join(words[:max_length]).strip())
-                words = words[max_length:]
-            current_chunk = words
-            current_len = len(words)
-    if current_chunk:
-        chunks.append(' '.join(current_chunk).strip())
-    # Remove any empty chunks
-    return [chunk for chunk in chunks if chunk]
+        if lengths[i] > max_tokens:
+            if window:
+                flush()
+                window, window_tokens = [], 0
+            end = float(seg["start"]) + float(seg.get("duration", 0.0))
+            for piece in chunk_text_tokens(texts[i], max_tokens, overlap_tokens, tokenizer):
+                chunks.append({"text": piece, "start": float(seg["start"]), "end": end})
+            continue
+        if window and window_tokens + lengths[i] > max_tokens:
+            flush()
+            # Carry trailing segments forward as overlap
+            carried, carried_tokens = [], 0
+            for j in reversed(window):
+                if carried_tokens + lengths[j] > overlap_tokens or carried_tokens + lengths[j] + lengths[i] > max_tokens:
+                    break
+                carried.insert(0, j)
+                carried_tokens += lengths[j]
+            window, window_tokens = carried, carried_tokens
+        window.append(i)
+        window_tokens += lengths[i]
+    if window:
+        flush()
+    return chunks
+
+@traced("chunk_time_windows", sizes=lambda chunks: {"chunks": len(chunks)})
+def chunk_time_windows(segments, window_seconds=CHUNK_WINDOW_SECONDS, overlap_seconds=CHUNK_WINDOW_OVERLAP_SECONDS,
+                       max_tokens=None, tokenizer=None):
+    """
+    Groups timed transcript segments into fixed time windows of window_seconds, starting each window
+    overlap_seconds before the previous one ended. A window is closed early if it would exceed
+    max_tokens, so chunks still fit the embedding model. Returns a list of dicts with 'text', 'start' and 'end'.
+    """
+    tokenizer, max_tokens = _resolve(tokenizer, max_tokens)
+    items = [(i, seg["text"].strip()) for i, seg in enumerate(segments) if seg["text"].strip()]
+    if not items:
+        return []
+    texts = [text for _, text in items]
+    if tokenizer is not None:
+        lengths = [len(ids) for ids in tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]]
+    else:
+        lengths = [int(len(t.split()) / 0.75) + 1 for t in texts]
+    starts = [float(segments[i]["start"]) for i, _ in items]
+    ends = [starts[k] + float(segments[i].get("duration", 0.0)) for k, (i, _) in enumerate(items)]
+    chunks = []
+    first = 0
+    while first < len(items):
+        window_end = starts[first] + window_seconds
+        last = first
+        tokens = lengths[first]
+        while last + 1 < len(items) and starts[last + 1] < window_end and tokens + lengths[last + 1] <= max_tokens:
+            last += 1
+            tokens += lengths[last]
+        chunks.append({
+            "text": " ".join(texts[first:last + 1]),
+            "start": starts[first],
+            "end": max(ends[first:last + 1]),
+        })
+        if last + 1 >= len(items):
+            break
+        # Next window starts at the first segment inside the overlap, repeating at most half of this window
+        overlap_start = starts[last + 1] - overlap_seconds
+        nxt = last + 1
+        while nxt - 1 > first + (last - first) // 2 and starts[nxt - 1] >= overlap_start:
+            nxt -= 1
+        first = nxt
+    return chunks
+
+def _semantic_windows(text, segments, window_words):
+    """
+    Splits a transcript into short windows of about window_words words.
+    Returns (texts, spans): spans are (char_start, char_end) into text, or (start, end) seconds for segments.
+    """
+    texts, spans = [], []
+    if segments:
+        current, words, first = [], 0, None
+        for seg in segments:
+            seg_text = seg["text"].strip()
+            if not seg_text:
+                continue
+            if first is None:
+                first = seg
+            current.append(seg_text)
+            words += len(seg_text.split())
+            if words >= window_words:
+                texts.append(" ".join(current))
+                spans.append((float(first["start"]), float(seg["start"]) + float(seg.get("duration", 0.0))))
+                current, words, first = [], 0, None
+        if current:
+            last = [seg for seg in segments if seg["text"].strip()][-1]
+            texts.append(" ".join(current))
+            spans.append((float(first["start"]), float(last["start"]) + float(last.get("duration", 0.0))))
+    else:
+        for m in _piece_pattern(window_words).finditer(text):
+            texts.append(m.group())
+            spans.append(m.span())
+    return texts, spans
+
+@traced("chunk_semantic", sizes=lambda chunks: {"chunks": len(chunks)})
+def chunk_semantic(text=None, segments=None, window_words=SEMANTIC_WINDOW_WORDS,
+                   break_percentile=SEMANTIC_BREAK_PERCENTILE, max_tokens=None, encoder=None, batch_size=64):
+    """
+    Places chunk boundaries where the topic shifts, for transcripts without usable punctuation.
+    The transcript (text, or timed segments if given) is cut into short windows that are embedded in batches;
+    a boundary goes after a window whose similarity to the next falls in the lowest break_percentile percent.
+    Chunks are also closed when they would exceed max_tokens (estimated from word counts).
+    Each chunk's vector is the normalized mean of its window embeddings, so no extra encoder pass is needed.
+    Returns a list of dicts with 'text', 'start', 'end' (seconds, or None for plain text) and 'embedding'.
+    """
+    if encoder is None:
+        from utils.embedding_utils import get_embedding_model
+        encoder = get_embedding_model()
+    if encoder is None:
+        logging.warning("Embedding model unavailable, falling back to token-based chunking.")
+        source = text if text is not None else " ".join(seg["text"] for seg in segments or [])
+        return [{"text": c, "start": None, "end": None, "embedding": None} for c in iter_chunks_tokens(source)]
+    _, max_tokens = _resolve(encoder.tokenizer, max_tokens)
+    texts, spans = _semantic_windows(text, segments, window_words)
+    if not texts:
+        return []
+    vectors = np.asarray(encoder.encode(texts, batch_size=batch_size), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarities = np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+    threshold = np.percentile(similarities, break_percentile) if len(similarities) else 0.0
+    max_windows = max(1, int(max_tokens * 0.75) // window_words)
+
+    chunks = []
+    first = 0
+    for i in range(len(texts)):
+        size = i - first + 1
+        is_last = i == len(texts) - 1
+        if is_last or size >= max_windows or (size >= 2 and similarities[i] <= threshold):
+            mean = vectors[first:i + 1].mean(axis=0)
+            mean /= max(float(np.linalg.norm(mean)), 1e-12)
+            if segments:
+                chunk_text_ = " ".join(texts[first:i + 1])
+                start, end = spans[first][0], spans[i][1]
+            else:
+                chunk_text_ = text[spans[first][0]:spans[i][1]]
+                start = end = None
+            chunks.append({"text": chunk_text_, "start": start, "end": end, "embedding": mean})
+            first = i + 1
+    return chunks
@@ -0,0 +1,148 @@
+"""
+Lightweight tracing for the pipeline stages. Each span times one stage, carries sizes (bytes, chunks,
+tokens, ...), is logged on the "trace" logger (its record's "span" field in the JSON log), and feeds
+per-stage p50/p95 summaries.
+
+    with span("encode", chunks=len(texts)) as s:
+        vectors = model.encode(texts)
+        s["dims"] = vectors.shape[1]
+
+    @traced("whisper_transcribe")
+    def transcribe(path): ...
+"""
+import time
+import uuid
+import logging
+import threading
+import functools
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from config import TRACING_ENABLED, TRACE_WINDOW
+from utils.metrics import Counter, Histogram
+
+trace_logger = logging.getLogger("trace")
+
+_current = contextvars.ContextVar("current_span", default=None)
+_collector = contextvars.ContextVar("latency_collector", default=None)
+_durations = defaultdict(lambda: deque(maxlen=TRACE_WINDOW))
+_errors = defaultdict(int)
+_lock = threading.Lock()
+
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Duration of traced pipeline stages", ["stage"])
+STAGE_ERRORS = Counter("stage_errors_total", "Traced pipeline stages that raised", ["stage"])
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Times the enclosed block as one stage. Yields a dict of attributes that the block can add sizes to;
+    its "duration_ms" is set when the block exits. Every span feeds the stage_duration_seconds metric;
+    with TRACING_ENABLED it is also logged, and spans opened inside another span (in the same thread or task)
+    record it as their parent.
+    """
+    record = token = None
+    if TRACING_ENABLED:
+        parent = _current.get()
+        record = {
+            "stage": stage,
+            "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex[:16],
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+        }
+        token = _current.set(record)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        attrs["duration_ms"] = round(elapsed * 1000, 3)
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        collected = _collector.get()
+        if collected is not None:
+            collected[stage] = round(collected.get(stage, 0.0) + elapsed * 1000, 3)
+        if status != "ok":
+            STAGE_ERRORS.inc(stage=stage)
+        if record is not None:
+            _current.reset(token)
+            record.update(start=round(time.time() - elapsed, 6), status=status, **attrs)
+            with _lock:
+                _durations[stage].append(elapsed)
+                if status != "ok":
+                    _errors[stage] += 1
+            trace_logger.info("%s %.3f ms %s", stage, elapsed * 1000, status, extra={"span": record})
+
+@contextmanager
+def collect_latencies():
+    """
+    Yields a dict that gets the duration in ms of every span finished inside the block, summed per stage,
+    including spans in threads that run in a copy of this context (contextvars.copy_context).
+    Works whether or not TRACING_ENABLED is set.
+    """
+    latencies = {}
+    token = _collector.set(latencies)
+    try:
+        yield latencies
+    finally:
+        _collector.reset(token)
+
+def current_trace_id():
+    """
+    Returns the trace id of the span the caller is running in, or None.
+    """
+    record = _current.get()
+    return record["trace_id"] if record else None
+
+def traced(stage=None, sizes=None):
+    """
+    Decorator form of span; the stage defaults to the function's name.
+    sizes, if given, maps the function's return value to attributes for the span, e.g. {"chunks": len(result)}.
+    """
+    def decorate(fn):
+        name = stage or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as s:
+                result = fn(*args, **kwargs)
+                if sizes is not None:
+                    s.update(sizes(result))
+                return result
+        return wrapper
+    return decorate
+
+def _percentile(ordered, pct):
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def summary():
+    """
+    Returns per-stage latency over the last TRACE_WINDOW spans: count, errors, p50, p95 and max in ms.
+    """
+    with _lock:
+        snapshot = {stage: sorted(values) for stage, values in _durations.items()}
+        errors = dict(_errors)
+    return {
+        stage: {
+            "count": len(values),
+            "errors": errors.get(stage, 0),
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p95_ms": round(_percentile(values, 95) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+        for stage, values in sorted(snapshot.items()) if values
+    }
+
+def reset():
+    """
+    Clears the latency window behind summary(), e.g. between benchmark phases.
+    """
+    with _lock:
+        _durations.clear()
+        _errors.clear()
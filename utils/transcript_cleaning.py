@@ -0,0 +1,86 @@
+import re
+import logging
+
+# Caption tags for non-speech audio ("[Music]", "(laughter)", "♪", speaker-change ">>") and filler words,
+# in one pattern so each caption is scanned once
+NOISE = re.compile(
+    r'[\[(](?:music|applause|laughter|laughs|inaudible|noise|silence|cheering|foreign|__)[\])]|[♪♫]+|>>'
+    r'|\b(?:u+m+|u+h+|e+r+m+|h+m+)\b[,.]?',
+    re.IGNORECASE,
+)
+WHITESPACE = re.compile(r'\s+')
+
+# Rolling captions repeat at most a line or two of the previous caption
+MAX_OVERLAP_WORDS = 24
+MIN_OVERLAP_WORDS = 2
+
+def clean_text(text):
+    """
+    Removes non-speech caption tags and filler words and collapses whitespace.
+    """
+    text = NOISE.sub(" ", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+def _overlap(tail, words):
+    """
+    Returns how many leading words of words repeat the end of tail (0 if fewer than MIN_OVERLAP_WORDS,
+    unless the whole caption is a repeat).
+    """
+    if not words:
+        return 0
+    first = words[0]
+    # Only positions where the caption's first word occurs can start an overlap; try the longest first
+    for j in range(max(0, len(tail) - len(words)), len(tail)):
+        if tail[j] == first and tail[j:] == words[:len(tail) - j]:
+            k = len(tail) - j
+            return k if k == len(words) or k >= MIN_OVERLAP_WORDS else 0
+    return 0
+
+def normalize_segments(segments):
+    """
+    Cleans timed caption segments before they are joined and chunked: drops noise tags and fillers,
+    collapses whitespace, and strips the words a rolling auto-caption repeats from the previous one.
+    Segments left empty are dropped. Runs in one pass, comparing only the last MAX_OVERLAP_WORDS words.
+    Returns (segments, stats) where stats holds the character counts before and after and the reduction ratio.
+    """
+    cleaned = []
+    tail = []
+    chars_in = chars_out = 0
+    for seg in segments:
+        chars_in += len(seg["text"])
+        cleaned_text = NOISE.sub(" ", seg["text"])
+        words = cleaned_text.split()
+        lowered = cleaned_text.lower().split()
+        skip = _overlap(tail, lowered) if tail else 0
+        if skip == len(words):
+            continue
+        text = " ".join(words[skip:])
+        chars_out += len(text)
+        cleaned.append(dict(seg, text=text))
+        tail = (tail + lowered[skip:])[-MAX_OVERLAP_WORDS:]
+    stats = {
+        "segments_in": len(segments),
+        "segments_out": len(cleaned),
+        "chars_in": chars_in,
+        "chars_out": chars_out,
+        "reduction": 1 - chars_out / chars_in if chars_in else 0.0,
+    }
+    return cleaned, stats
+
+def normalize_transcript(text, segments=None, label="transcript"):
+    """
+    Normalizes a transcript and its timed segments, if any, and logs the reduction ratio.
+    With segments the text is rebuilt from the cleaned segments; otherwise only clean_text is applied.
+    Returns (text, segments).
+    """
+    if segments:
+        segments, stats = normalize_segments(segments)
+        text = " ".join(seg["text"] for seg in segments)
+    else:
+        cleaned = clean_text(text)
+        stats = {"chars_in": len(text), "chars_out": len(cleaned),
+                 "reduction": 1 - len(cleaned) / len(text) if text else 0.0}
+        text = cleaned
+    logging.info("Normalized %s: %s -> %s chars (%.1f%% removed)",
+                 label, stats['chars_in'], stats['chars_out'], stats['reduction'] * 100)
+    return text, segments
@@ -1,22 +1,74 @@
-import whisper
 import logging
 import os
+import threading
+import time
+from functools import lru_cache
+from utils.tracing import span
+from utils.metrics import Counter, Histogram, record_model_memory
 
-# Load the model once (small model to save resources and speed up transcription)
-try:
-    model = whisper.load_model(os.environ.get("WHISPER_MODEL_SIZE", "small"))
-except Exception as e:
-    logging.error(f"Failed to load Whisper model: {e}")
-    model = None
+WHISPER_RTF = Histogram("whisper_real_time_factor", "Transcription time divided by audio duration",
+                        buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0))
+WHISPER_AUDIO_SECONDS = Counter("whisper_audio_seconds_total", "Seconds of audio transcribed by Whisper")
+
+_model_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _load_model():
+    try:
+        start = time.perf_counter()
+        import whisper
+        # Small model by default to save resources and speed up transcription
+        model = whisper.load_model(os.environ.get("WHISPER_MODEL_SIZE", "small"))
+        logging.info("Loaded Whisper model in %.1fs", time.perf_counter() - start)
+        record_model_memory("whisper", model)
+        return model
+    except Exception as e:
+        logging.error("Failed to load Whisper model: %s", e)
+        return None
+
+def get_whisper_model():
+    """
+    Returns the Whisper model, importing whisper (and torch) and loading the model on first use,
+    once per process. Returns None if it cannot be loaded.
+    """
+    with _model_lock:
+        return _load_model()
+
+# Whisper models are not safe to share across concurrent transcribe calls
+_transcribe_lock = threading.Lock()
+
+def to_segments(result):
+    """
+    Converts Whisper segments to the transcript segment format used for chunking: dicts with text, start and duration.
+    """
+    return [
+        {"text": seg["text"].strip(), "start": float(seg["start"]), "duration": float(seg["end"]) - float(seg["start"])}
+        for seg in result.get("segments", [])
+    ]
 
 def generate_transcript(audio_path):
+    text, _ = generate_timed_transcript(audio_path)
+    return text
+
+def generate_timed_transcript(audio_path):
+    """
+    Transcribes audio and returns (text, segments). On failure returns ("[ERROR] ...", None).
+    """
+    model = get_whisper_model()
     if model is None:
         logging.error("Whisper model is not loaded.")
-        return "[ERROR] Whisper model not loaded."
+        return "[ERROR] Whisper model not loaded.", None
     try:
-        logging.info(f"Transcribing audio: {audio_path}")
-        result = model.transcribe(audio_path)
-        return result["text"]
+        logging.info("Transcribing audio: %s", audio_path)
+        with _transcribe_lock, span("whisper_transcribe", bytes=os.path.getsize(audio_path)) as s:
+            result = model.transcribe(audio_path)
+            segments = to_segments(result)
+            s.update(segments=len(segments), chars=len(result["text"]),
+                     audio_seconds=round(segments[-1]["start"] + segments[-1]["duration"], 3) if segments else 0.0)
+        if s["audio_seconds"] > 0:
+            WHISPER_RTF.observe(s["duration_ms"] / 1000 / s["audio_seconds"])
+            WHISPER_AUDIO_SECONDS.inc(s["audio_seconds"])
+        return result["text"], segments
     except Exception as e:
-        logging.error(f"Transcription failed for {audio_path}: {e}")
-        return f"[ERROR] Transcription failed: {e}"
+        logging.error("Transcription failed for %s: %s", audio_path, e)
+        return f"[ERROR] Transcription failed: {e}", None
@@ -1,9 +1,15 @@
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
 import subprocess
 import os
 import logging
+import requests
 from langdetect import detect
-from utils.whisper_utils import generate_transcript
+from config import (NORMALIZE_TRANSCRIPTS, TRANSCRIPT_LANGUAGES, TRANSCRIPT_PREFER_MANUAL,
+                    TRANSCRIPT_TRANSLATE_TO, TRANSCRIPT_TIMEOUT_SECONDS, PLAYLIST_MAX_VIDEOS, YTDLP_TIMEOUT_SECONDS)
+from utils.whisper_utils import generate_timed_transcript, to_segments
+from utils.transcript_cleaning import normalize_transcript
+from utils.source_keys import video_id as parse_video_id, canonical_url, is_video_id
+from utils.tracing import span
 
 LANGUAGE_MAP = {
     "en": "english",
@@ -19,48 +25,172 @@ LANGUAGE_MAP = {
     # Add more as needed
 }
 
-def extract_video_id(url):
-    return url.split("v=")[-1].split("&")[0]
+# yt-dlp errors meaning the video itself cannot be downloaded by anyone, as opposed to network
+# errors, throttling or a broken local setup
+PERMANENT_FAILURE_MARKERS = (
+    "video unavailable",
+    "private video",
+    "this video has been removed",
+    "this video is not available",
+    "members-only",
+    "sign in to confirm your age",
+    "copyright claim",
+    "account associated with this video has been terminated",
+)
 
 def detect_language(text):
     try:
         lang_code = detect(text)
         return LANGUAGE_MAP.get(lang_code, "english")
     except Exception as e:
-        logging.warning(f"Language detection failed: {e}")
+        logging.warning("Language detection failed: %s", e)
         return "english"
 
+class _TimeoutSession(requests.Session):
+    """
+    A requests session that applies a default timeout to every request, since the transcript API sets none.
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+def pick_transcript(transcripts, languages=TRANSCRIPT_LANGUAGES, prefer_manual=TRANSCRIPT_PREFER_MANUAL,
+                    translate_to=TRANSCRIPT_TRANSLATE_TO):
+    """
+    Chooses one of a video's listed transcripts: the first language in languages that has one (manual
+    captions before auto-generated ones if prefer_manual), otherwise a translatable transcript translated
+    server-side to translate_to, otherwise whatever transcript exists. Returns a Transcript or None.
+    """
+    transcripts = list(transcripts)
+    # False sorts first, so manual captions (is_generated=False) come first when preferred
+    ordered = sorted(transcripts, key=lambda t: t.is_generated if prefer_manual else not t.is_generated)
+    for language in languages:
+        for transcript in ordered:
+            code = transcript.language_code.lower()
+            if code == language or code.split("-")[0] == language:
+                return transcript
+    if translate_to:
+        for transcript in ordered:
+            if transcript.is_translatable and any(
+                    lang.language_code == translate_to for lang in transcript.translation_languages):
+                return transcript.translate(translate_to)
+    return ordered[0] if ordered else None
+
+def fetch_youtube_transcript(video_id, timeout=TRANSCRIPT_TIMEOUT_SECONDS):
+    """
+    Lists the video's transcripts once, picks one with pick_transcript and fetches it.
+    Returns (segments, language_code), or (None, None) if the video has no usable transcript.
+    Network errors and timeouts are raised to the caller.
+    """
+    api = YouTubeTranscriptApi(http_client=_TimeoutSession(timeout))
+    with span("transcript_fetch", video_id=video_id) as s:
+        try:
+            transcript = pick_transcript(api.list(video_id))
+        except (NoTranscriptFound, TranscriptsDisabled) as e:
+            logging.info("No transcripts for %s: %s", video_id, type(e).__name__)
+            s["found"] = False
+            return None, None
+        if transcript is None:
+            s["found"] = False
+            return None, None
+        segments = [
+            {"text": entry["text"], "start": float(entry["start"]), "duration": float(entry.get("duration", 0.0))}
+            for entry in transcript.fetch().to_raw_data()
+        ]
+        s.update(found=True, segments=len(segments), chars=sum(len(seg["text"]) for seg in segments))
+    logging.info("Fetched %s '%s' transcript for %s",
+                 "generated" if transcript.is_generated else "manual", transcript.language_code, video_id)
+    return segments, transcript.language_code
+
+def is_permanent_failure(error):
+    """
+    Returns True if a get_timed_transcript error means the video can never be ingested: it has no usable
+    captions and yt-dlp refused the download because the video is unavailable, private, removed or restricted.
+    """
+    if not error.startswith("[ERROR] yt-dlp failed to download audio:"):
+        return False
+    stderr = error.lower()
+    return any(marker in stderr for marker in PERMANENT_FAILURE_MARKERS)
+
+def list_playlist_videos(url, limit=PLAYLIST_MAX_VIDEOS, timeout=YTDLP_TIMEOUT_SECONDS):
+    """
+    Returns the video ids of a playlist or channel URL, in playlist order, using yt-dlp's flat extraction
+    (one listing request per page of the playlist, no media downloads). Raises RuntimeError on failure.
+    """
+    yt_dlp_cmd = [
+        "yt-dlp", "--flat-playlist", "--print", "id", "--playlist-end", str(limit), "--no-warnings", url
+    ]
+    try:
+        with span("playlist_list", url=url):
+            result = subprocess.run(yt_dlp_cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"yt-dlp timed out listing {url}")
+    except OSError as e:
+        # e.g. yt-dlp is not installed
+        raise RuntimeError(f"Could not run yt-dlp to list {url}: {e}")
+    if result.returncode != 0:
+        raise RuntimeError(f"yt-dlp failed to list {url}: {result.stderr.strip()}")
+    ids = (line.strip() for line in result.stdout.splitlines())
+    return list(dict.fromkeys(i for i in ids if is_video_id(i)))
+
 def get_transcript_or_generate(url=None, audio_path=None):
+    text, _ = get_timed_transcript(url, audio_path)
+    return text
+
+def _finish(transcript, segments, label, language_code=None):
+    """
+    Normalizes the transcript (caption dedup, noise removal) and prefixes its language,
+    taken from language_code when known and detected otherwise.
+    """
+    if NORMALIZE_TRANSCRIPTS:
+        with span("normalize", chars_in=len(transcript)) as s:
+            transcript, segments = normalize_transcript(transcript, segments, label)
+            s["chars_out"] = len(transcript)
+    lang = LANGUAGE_MAP.get((language_code or "").lower()) or detect_language(transcript)
+    return f"[{lang.upper()} TRANSCRIPT]\n" + transcript, segments
+
+def _fallback_transcribe(audio_path, model_name):
+    import whisper
+    fallback_model = whisper.load_model(model_name)
+    transcript_result = fallback_model.transcribe(audio_path)
+    return transcript_result["text"], to_segments(transcript_result)
+
+def get_timed_transcript(url=None, audio_path=None):
+    """
+    Like get_transcript_or_generate, but also returns the timed segments (dicts with text, start and duration)
+    from the YouTube transcript or Whisper. Returns (text, segments); text is an [ERROR] string on failure.
+    """
     if audio_path:
-        transcript = generate_transcript(audio_path)
+        transcript, segments = generate_timed_transcript(audio_path)
         if transcript.strip().startswith('[ERROR]'):
             try:
-                import whisper
-                fallback_model = whisper.load_model("small")
-                transcript_result = fallback_model.transcribe(audio_path)
-                transcript = transcript_result["text"]
+                transcript, segments = _fallback_transcribe(audio_path, "small")
             except Exception as e:
-                logging.error(f"Fallback Whisper model also failed: {e}")
-                return f"[ERROR] Whisper fallback failed: {e}"
-        lang = detect_language(transcript)
-        return f"[{lang.upper()} TRANSCRIPT]\n" + transcript
+                logging.error("Fallback Whisper model also failed: %s", e)
+                return f"[ERROR] Whisper fallback failed: {e}", None
+        return _finish(transcript, segments, audio_path)
 
-    video_id = extract_video_id(url)
-    transcript = None
+    video_id = parse_video_id(url)
+    if video_id is None:
+        return f"[ERROR] Not a YouTube video URL: {url}", None
+    # Timestamps, playlist and tracking parameters do not change the video, so do not pass them on
+    url = canonical_url("video", video_id)
     try:
         try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-        except Exception:
-            try:
-                transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['hi'])
-            except Exception:
-                transcript = None
-        if transcript:
-            text = " ".join([entry['text'] for entry in transcript])
-            lang = detect_language(text)
-            return f"[{lang.upper()} TRANSCRIPT]\n" + text
+            segments, language_code = fetch_youtube_transcript(video_id)
+        except Exception as e:
+            logging.warning("Transcript fetch failed for %s: %s", url, e)
+            segments, language_code = None, None
+        if segments:
+            text = " ".join(entry['text'] for entry in segments)
+            return _finish(text, segments, url, language_code)
         else:
-            logging.warning(f"No transcript found for {url}, falling back to Whisper.")
+            logging.warning("No transcript found for %s, falling back to Whisper.", url)
             # Fallback to Whisper for any missing transcript
             audio_dir = "temp_audio"
             os.makedirs(audio_dir, exist_ok=True)
@@ -68,32 +198,28 @@ def get_transcript_or_generate(url=None, audio_path=None):
             yt_dlp_cmd = [
                 "yt-dlp", "-x", "--audio-format", "mp3", "-o", audio_path, url
             ]
-            result = subprocess.run(yt_dlp_cmd, capture_output=True, text=True)
+            with span("ytdlp_download", video_id=video_id) as s:
+                result = subprocess.run(yt_dlp_cmd, capture_output=True, text=True)
+                s["bytes"] = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
             if result.returncode != 0 or not os.path.exists(audio_path):
-                logging.error(f"yt-dlp failed: {result.stderr}")
-                return f"[ERROR] yt-dlp failed to download audio: {result.stderr}"
-            transcript = generate_transcript(audio_path)
+                logging.error("yt-dlp failed: %s", result.stderr)
+                return f"[ERROR] yt-dlp failed to download audio: {result.stderr}", None
+            transcript, segments = generate_timed_transcript(audio_path)
             if transcript.strip().startswith('[ERROR]'):
                 try:
-                    import whisper
-                    logging.warning(f"Main Whisper model failed, trying 'small' model for {url}")
-                    fallback_model = whisper.load_model("small")
-                    transcript_result = fallback_model.transcribe(audio_path)
-                    transcript = transcript_result["text"]
+                    logging.warning("Main Whisper model failed, trying 'small' model for %s", url)
+                    transcript, segments = _fallback_transcribe(audio_path, "small")
                 except Exception as e:
-                    logging.error(f"'small' Whisper model also failed: {e}")
+                    logging.error("'small' Whisper model also failed: %s", e)
                     try:
-                        logging.warning(f"Trying 'tiny' Whisper model for {url}")
-                        tiny_model = whisper.load_model("tiny")
-                        transcript_result = tiny_model.transcribe(audio_path)
-                        transcript = transcript_result["text"]
+                        logging.warning("Trying 'tiny' Whisper model for %s", url)
+                        transcript, segments = _fallback_transcribe(audio_path, "tiny")
                     except Exception as e2:
-                        logging.error(f"'tiny' Whisper model also failed: {e2}")
-                        return f"[ERROR] Whisper fallback failed: {e} | Tiny model: {e2}"
+                        logging.error("'tiny' Whisper model also failed: %s", e2)
+                        return f"[ERROR] Whisper fallback failed: {e} | Tiny model: {e2}", None
             if os.path.exists(audio_path):
                 os.remove(audio_path)
-            lang = detect_language(transcript)
-            return f"[{lang.upper()} TRANSCRIPT]\n" + transcript
+            return _finish(transcript, segments, url)
     except Exception as e:
-        logging.error(f"Failed to get transcript or generate with Whisper for {url}: {e}")
-        return f"[ERROR] Could not retrieve or generate transcript for this video: {e}"
+        logging.error("Failed to get transcript or generate with Whisper for %s: %s", url, e)
+        return f"[ERROR] Could not retrieve or generate transcript for this video: {e}", None